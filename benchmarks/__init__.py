@@ -0,0 +1,3 @@
+"""
+Benchmarks: performance measurement scripts, executed from the project root with python -m benchmarks.<name>
+"""
@@ -0,0 +1,120 @@
+"""
+Embrapa Stand-in Server: serves the CSV files in files/ as /download/{subcategory}.csv, like
+vitibrasil.cnpuv.embrapa.br, with configurable latency, throttling and failures.
+Usage: python -m benchmarks.embrapa_server [--port 8081] [--latency 0.2] [--throttle 65536]
+[--failure-rate 0.1] and EMBRAPA_URL=http://127.0.0.1:8081/download/{}.csv in .env
+"""
+import argparse
+import os
+import random
+import threading
+import time
+from http import HTTPStatus
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from pydantic import BaseModel
+
+FILES_PATH = 'files'
+CHUNK_SIZE = 8192
+
+
+class ServerOptions(BaseModel):
+    """Behaviour of the stand-in server"""
+    latency: float = 0.0
+    throttle: int = 0
+    failure_rate: float = 0.0
+    seed: int | None = None
+
+
+class EmbrapaHandler(BaseHTTPRequestHandler):
+    """Handler for GET /download/{subcategory}.csv"""
+    options = ServerOptions()
+    rng = random.Random()
+    lock = threading.Lock()
+
+    def do_GET(self):  # pylint: disable=invalid-name
+        """Send a CSV file after the configured latency, failing or throttling when configured"""
+        time.sleep(self.options.latency)
+        name = os.path.basename(self.path.split('?', 1)[0])
+        path = os.path.join(FILES_PATH, name)
+        if not self.path.startswith('/download/') or not os.path.isfile(path):
+            self.send_error(HTTPStatus.NOT_FOUND)
+            return
+        with self.lock:
+            failed = self.rng.random() < self.options.failure_rate
+        if failed:
+            self.send_error(HTTPStatus.SERVICE_UNAVAILABLE)
+            return
+
+        with open(path, 'rb') as file:
+            content = file.read()
+        self.send_response(HTTPStatus.OK)
+        self.send_header('Content-Type', 'text/csv')
+        self.send_header('Content-Length', str(len(content)))
+        self.end_headers()
+        for begin in range(0, len(content), CHUNK_SIZE):
+            chunk = content[begin:begin + CHUNK_SIZE]
+            self.wfile.write(chunk)
+            if self.options.throttle:
+                time.sleep(len(chunk) / self.options.throttle)
+
+    def log_message(self, format, *args):  # pylint: disable=redefined-builtin
+        """Requests are not logged, so they do not interfere in the measurements"""
+
+
+def start_server(options: ServerOptions, host: str = '127.0.0.1', port: int = 0) -> ThreadingHTTPServer:
+    """
+    Start the stand-in server in a daemon thread
+    :param options: latency, throttle (bytes per second, 0 means unlimited) and failure rate
+    :param host: listening address
+    :param port: listening port, 0 picks a free one
+    :return: running server (see server_address)
+    """
+    handler = type('ConfiguredEmbrapaHandler', (EmbrapaHandler,),
+                   {'options': options, 'rng': random.Random(options.seed)})
+    server = ThreadingHTTPServer((host, port), handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def server_url(server: ThreadingHTTPServer) -> str:
+    """
+    URL template to be used as EMBRAPA_URL
+    :param server: running server
+    :return: URL with {} in place of the subcategory
+    """
+    host, port = server.server_address[:2]
+    return f'http://{host}:{port}/download/{{}}.csv'
+
+
+def add_server_arguments(parser: argparse.ArgumentParser):
+    """
+    Command line options shared with the ingestion benchmark
+    :param parser: argument parser
+    """
+    parser.add_argument('--latency', type=float, default=0.0, help='seconds before each response')
+    parser.add_argument('--throttle', type=int, default=0, help='bytes per second, 0 means unlimited')
+    parser.add_argument('--failure-rate', type=float, default=0.0, help='probability of a 503 response')
+    parser.add_argument('--seed', type=int, default=None, help='seed for failures')
+
+
+def main():
+    """Run the stand-in server until interrupted"""
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--port', type=int, default=8081)
+    add_server_arguments(parser)
+    args = parser.parse_args()
+
+    options = ServerOptions(latency=args.latency, throttle=args.throttle,
+                            failure_rate=args.failure_rate, seed=args.seed)
+    server = start_server(options, port=args.port)
+    print(f'EMBRAPA_URL={server_url(server)}')
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        server.shutdown()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,84 @@
+"""
+Ingestion Benchmark Case: runs a single ingestion (mode and category) in its own process, so peak RSS
+is measured by case. Started by benchmarks.ingestion, prints the result as JSON in the last line.
+Existing subcategories of the category are deleted first, use only a dedicated database
+"""
+import argparse
+import asyncio
+import json
+import resource
+import time
+
+from fastapi.exceptions import HTTPException
+from sqlmodel import SQLModel
+
+from src.db.main import engine, session_factory
+from src.viticulture.clients import EmbrapaClient
+from src.viticulture.downloads import DownloadCache
+from src.viticulture.enums import CategoryEnum, ProcessModeEnum
+from src.viticulture.services import ViticultureService
+from src.viticulture.utils import menus
+
+PROCESS = {ProcessModeEnum.API: EmbrapaClient.process_api_mode,
+           ProcessModeEnum.FILE: EmbrapaClient.process_file_mode,
+           ProcessModeEnum.STREAM: EmbrapaClient.process_stream_mode}
+STAGES = {'download': 'fetch', 'parse': 'read', 'melt': 'melt', 'validate': 'validate', 'insert': 'write'}
+
+viticulture_service = ViticultureService()
+
+
+def peak_rss(who: int) -> float:
+    """
+    Peak resident set size
+    :param who: resource.RUSAGE_SELF or resource.RUSAGE_CHILDREN (parser processes already finished)
+    :return: megabytes
+    """
+    return round(resource.getrusage(who).ru_maxrss / 1024, 1)
+
+
+async def run_case(mode: ProcessModeEnum, category: CategoryEnum, cache_path: str) -> dict:
+    """
+    Delete the category data and ingest it again, measuring throughput, memory and stages
+    :param mode: process mode as Enum
+    :param category: category as Enum
+    :param cache_path: empty directory used as download cache
+    :return: case result
+    """
+    async with engine.begin() as connection:
+        await connection.run_sync(SQLModel.metadata.create_all)
+
+    client = EmbrapaClient()
+    client.cache = DownloadCache(cache_path)
+    result, error = {}, None
+    async with session_factory() as session:
+        for subcategory in menus[category.name]:
+            await viticulture_service.delete_subcategory(subcategory, session)
+        begin = time.perf_counter()
+        try:
+            result = await PROCESS[mode](client, category, session)
+        except HTTPException as e:
+            error = str(e.detail)
+        seconds = time.perf_counter() - begin
+    await client.close()
+    await engine.dispose()
+
+    timings = result.get('timings', {})
+    return {'mode': mode.value, 'category': category.value, 'rows': result.get('rows', 0),
+            'seconds': round(seconds, 3), 'rows_per_second': round(result.get('rows', 0) / seconds, 1),
+            'peak_rss_mb': peak_rss(resource.RUSAGE_SELF),
+            'peak_rss_workers_mb': peak_rss(resource.RUSAGE_CHILDREN),
+            'stages': {name: timings.get(key, 0.0) for name, key in STAGES.items()}, 'error': error}
+
+
+def main():
+    """Run the case given in command line and print its result"""
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('mode', type=ProcessModeEnum)
+    parser.add_argument('category', type=CategoryEnum)
+    parser.add_argument('--cache', required=True)
+    args = parser.parse_args()
+    print(json.dumps(asyncio.run(run_case(args.mode, args.category, args.cache))))
+
+
+if __name__ == '__main__':
+    main()
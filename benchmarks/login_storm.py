@@ -0,0 +1,124 @@
+"""
+Login Storm Benchmark: latency of a read endpoint while concurrent logins check bcrypt passwords,
+in memory through ASGI (no database): bcrypt called inside the route (previous login) and bcrypt in
+the password_hasher thread pool (BCRYPT_WORKERS and BCRYPT_QUEUE_SIZE, 503 when saturated).
+Usage: python -m benchmarks.login_storm [--logins 32] [--concurrency 8] [--readers 4]
+[--interval 10] [--rounds 12]
+"""
+import argparse
+import asyncio
+import time
+
+import bcrypt
+from fastapi import FastAPI
+from httpx import ASGITransport, AsyncClient
+
+from src.auth.utils import verify_password, password_hasher
+
+PASSWORD = 'secret123'
+
+
+def create_app(hashed_password: str) -> FastAPI:
+    """
+    Application with a read endpoint and one login endpoint by bcrypt path
+    :param hashed_password: stored password hash
+    :return: FastAPI application
+    """
+    app = FastAPI()
+
+    @app.get('/read')
+    async def read():
+        return {'subcategory': 'ProcessaViniferas', 'year': 2023}
+
+    @app.post('/inline')
+    async def inline_login():
+        return {'valid': bcrypt.checkpw(PASSWORD.encode('utf-8'), hashed_password.encode('utf-8'))}
+
+    @app.post('/pool')
+    async def pool_login():
+        return {'valid': await verify_password(PASSWORD, hashed_password)}
+
+    return app
+
+
+async def storm(client: AsyncClient, path: str, args: argparse.Namespace) -> dict:
+    """
+    Send the logins with a fixed concurrency while readers request the read endpoint
+    :param client: client bound to the ASGI application
+    :param path: login endpoint path
+    :param args: command line arguments
+    :return: read latencies (ms), login status codes and elapsed seconds
+    """
+    latencies, codes, remaining = [], [], [args.logins]
+    done = asyncio.Event()
+
+    async def login():
+        while remaining[0] > 0:
+            remaining[0] -= 1
+            codes.append((await client.post(path)).status_code)
+
+    async def reader():
+        # reads are scheduled at a fixed rate and measured from the scheduled time,
+        # so the time a read waits for a blocked event loop is counted as latency
+        scheduled = time.perf_counter()
+        while not done.is_set():
+            await asyncio.sleep(max(0.0, scheduled - time.perf_counter()))
+            (await client.get('/read')).raise_for_status()
+            latencies.append((time.perf_counter() - scheduled) * 1000)
+            scheduled += args.interval / 1000
+
+    readers = [asyncio.create_task(reader()) for _ in range(args.readers)]
+    await asyncio.sleep(0.1)
+    begin = time.perf_counter()
+    await asyncio.gather(*[login() for _ in range(args.concurrency)])
+    elapsed = time.perf_counter() - begin
+    done.set()
+    await asyncio.gather(*readers)
+    return {'latencies': latencies, 'codes': codes, 'elapsed': elapsed}
+
+
+def percentile(values: list[float], fraction: float) -> float:
+    """
+    Nearest-rank percentile
+    :param values: measured values
+    :param fraction: percentile between 0 and 1
+    :return: value below which the given fraction of the values falls
+    """
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * fraction))]
+
+
+async def run(args: argparse.Namespace):
+    """
+    Print the read latency percentiles of each bcrypt path
+    :param args: command line arguments
+    """
+    hashed_password = bcrypt.hashpw(PASSWORD.encode('utf-8'), bcrypt.gensalt(rounds=args.rounds)).decode()
+    transport = ASGITransport(app=create_app(hashed_password))
+    async with AsyncClient(transport=transport, base_url='http://benchmark') as client:
+        results = {path: await storm(client, path, args) for path in ('/inline', '/pool')}
+    password_hasher.close()
+
+    print(f'{args.logins} logins ({args.concurrency} concurrent), {args.readers} readers, '
+          f'bcrypt rounds {args.rounds}, {password_hasher.workers} workers')
+    print(f'{"login":<10}{"reads":>8}{"p50 ms":>10}{"p99 ms":>10}{"max ms":>10}{"503":>6}{"seconds":>10}')
+    for path, result in results.items():
+        latencies = result['latencies']
+        p50, p99 = (percentile(latencies, fraction) for fraction in (0.5, 0.99))
+        print(f'{path:<10}{len(latencies):>8}{p50:>10.1f}{p99:>10.1f}{max(latencies):>10.1f}'
+              f'{result["codes"].count(503):>6}{result["elapsed"]:>10.2f}')
+
+
+def main():
+    """Run the login storm benchmark"""
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--logins', type=int, default=32)
+    parser.add_argument('--concurrency', type=int, default=8)
+    parser.add_argument('--readers', type=int, default=4)
+    parser.add_argument('--interval', type=float, default=10, help='milliseconds between reads of a reader')
+    parser.add_argument('--rounds', type=int, default=12, help='bcrypt cost of the stored password')
+    asyncio.run(run(parser.parse_args()))
+
+
+if __name__ == '__main__':
+    main()
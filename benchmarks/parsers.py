@@ -0,0 +1,102 @@
+"""
+Parsers Benchmark: compares the legacy CSV reading (regex over the whole text and pandas python engine)
+with parsers.read_csv, and the sequential conversion of all Embrapa files with the process pool one.
+Usage: python -m benchmarks.parsers [--repeat 20] [--workers 4]
+"""
+import argparse
+import os
+import re
+import time
+from collections.abc import Callable
+from concurrent.futures import ProcessPoolExecutor
+from io import StringIO
+
+import pandas as pd
+from pandas import DataFrame
+
+from src.viticulture.parsers import parse_content, read_csv
+from src.viticulture.utils import menus, FILE_PATH, read_file
+
+CATEGORY_UID = '00000000-0000-4000-8000-000000000000'
+
+
+def legacy_read_csv(content: bytes) -> DataFrame:
+    """
+    Previous implementation, kept only as benchmark baseline
+    :param content: raw CSV content
+    :return: wide dataframe
+    """
+    text = content.decode('utf-8', errors='ignore')
+    separator = ','
+    if re.search('\t', text):
+        separator = '\t'
+    elif re.search(';', text):
+        separator = ';'
+
+    text = text.replace('\x81', '').replace('\x88', '')
+    return pd.read_csv(StringIO(text), sep=separator, engine='python')
+
+
+def best_of(repeat: int, function: Callable, *args) -> float:
+    """
+    Run a function several times
+    :param repeat: number of executions
+    :param function: function to be measured
+    :param args: function arguments
+    :return: fastest execution in milliseconds
+    """
+    timings = []
+    for _ in range(repeat):
+        begin = time.perf_counter()
+        function(*args)
+        timings.append(time.perf_counter() - begin)
+    return min(timings) * 1000
+
+
+def parse_all(sources: list[tuple[str, str, bytes]], workers: int) -> int:
+    """
+    Convert every source, sequentially (workers=0) or in a process pool
+    :param sources: list of (category, subcategory, content)
+    :param workers: number of processes
+    :return: number of parsed rows
+    """
+    args = ([content for _, _, content in sources], [category for category, _, _ in sources],
+            [CATEGORY_UID] * len(sources), [option for _, option, _ in sources])
+    if not workers:
+        return sum(len(parse_content(*item)) for item in zip(*args))
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        return sum(len(frame) for frame in pool.map(parse_content, *args))
+
+
+def main():
+    """Print read_csv timings by file and the conversion timings of all files"""
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--repeat', type=int, default=20)
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 2)
+    args = parser.parse_args()
+
+    sources = [(category, option, read_file(FILE_PATH.format(option)))
+               for category, options in menus.items() for option in options]
+
+    print(f'{"file":<20}{"bytes":>10}{"legacy ms":>12}{"read_csv ms":>14}{"speedup":>10}')
+    total_legacy = total_new = 0.0
+    for _, option, content in sources:
+        legacy = best_of(args.repeat, legacy_read_csv, content)
+        new = best_of(args.repeat, read_csv, content)
+        total_legacy += legacy
+        total_new += new
+        print(f'{option:<20}{len(content):>10}{legacy:>12.2f}{new:>14.2f}{legacy / new:>9.1f}x')
+    print(f'{"total":<20}{"":>10}{total_legacy:>12.2f}{total_new:>14.2f}{total_legacy / total_new:>9.1f}x')
+
+    begin = time.perf_counter()
+    rows = parse_all(sources, 0)
+    sequential = time.perf_counter() - begin
+    begin = time.perf_counter()
+    parse_all(sources, args.workers)
+    parallel = time.perf_counter() - begin
+    print(f'\nparse_content of {len(sources)} files ({rows} rows): sequential {sequential * 1000:.0f} ms, '
+          f'{args.workers} processes {parallel * 1000:.0f} ms (including pool start)')
+
+
+if __name__ == '__main__':
+    main()
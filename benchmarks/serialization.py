@@ -0,0 +1,111 @@
+"""
+Serialization Benchmark: compares the response paths of the subcategory endpoint with the rows of the
+largest Embrapa subcategory, in memory through ASGI (no database): ORM rows validated by response_model
+(previous path), DTO page validated by response_model (default) and FastJSONResponse (FAST_RESPONSES).
+Usage: python -m benchmarks.serialization [--repeat 20] [--rows 1000]
+"""
+import argparse
+import asyncio
+import json
+import time
+import uuid
+from datetime import datetime
+
+from fastapi import FastAPI
+from httpx import ASGITransport, AsyncClient
+
+from src.db.models import SubCategory
+from src.viticulture.parsers import parse_content
+from src.viticulture.responses import FastJSONResponse
+from src.viticulture.schemas import SubCategoryModel, SubCategoryPageModel
+from src.viticulture.utils import menus, FILE_PATH, read_file
+
+CATEGORY_UID = '00000000-0000-4000-8000-000000000000'
+
+
+def largest_subcategory(rows: int) -> list[SubCategory]:
+    """
+    Rows of the largest subcategory as ORM objects, like the ones read from database
+    :param rows: maximum number of rows (0 means all rows)
+    :return: subcategory rows
+    """
+    frames = [parse_content(read_file(FILE_PATH.format(option)), category, CATEGORY_UID, option)
+              for category, options in menus.items() for option in options]
+    frame = max(frames, key=len)
+    frame = frame.head(rows) if rows else frame
+    now = datetime.now()
+    return [SubCategory(uid=uuid.uuid4(), created_at=now, updated_at=now, **record)
+            for record in frame.to_dict('records')]
+
+
+def create_app(rows: list[SubCategory]) -> FastAPI:
+    """
+    Application with one endpoint by response path
+    :param rows: subcategory rows
+    :return: FastAPI application
+    """
+    app = FastAPI()
+    page = SubCategoryPageModel(items=[SubCategoryModel.model_validate(row, from_attributes=True)
+                                       for row in rows])
+
+    @app.get('/orm', response_model=list[SubCategoryModel])
+    async def orm_rows():
+        return rows
+
+    @app.get('/default', response_model=SubCategoryPageModel)
+    async def default_page():
+        return page
+
+    @app.get('/fast', response_model=SubCategoryPageModel)
+    async def fast_page():
+        return FastJSONResponse(page)
+
+    return app
+
+
+async def measure(client: AsyncClient, path: str, repeat: int) -> tuple[float, int, list]:
+    """
+    Request an endpoint several times
+    :param client: client bound to the ASGI application
+    :param path: endpoint path
+    :param repeat: number of requests
+    :return: fastest request in milliseconds, response size and response rows
+    """
+    timings = []
+    for _ in range(repeat):
+        begin = time.perf_counter()
+        response = await client.get(path)
+        timings.append(time.perf_counter() - begin)
+    content = json.loads(response.content)
+    return min(timings) * 1000, len(response.content), content if path == '/orm' else content['items']
+
+
+async def run(args: argparse.Namespace):
+    """
+    Print the timings of each response path
+    :param args: command line arguments
+    """
+    rows = largest_subcategory(args.rows)
+    transport = ASGITransport(app=create_app(rows))
+    async with AsyncClient(transport=transport, base_url='http://benchmark') as client:
+        results = {path: await measure(client, path, args.repeat) for path in ('/orm', '/default', '/fast')}
+
+    print(f'{rows[0].subcategory}: {len(rows)} rows')
+    print(f'{"path":<12}{"bytes":>12}{"ms":>10}{"speedup":>10}')
+    baseline = results['/orm'][0]
+    for path, (milliseconds, size, _) in results.items():
+        print(f'{path:<12}{size:>12}{milliseconds:>10.2f}{baseline / milliseconds:>9.1f}x')
+    if not results['/orm'][2] == results['/default'][2] == results['/fast'][2]:
+        raise SystemExit('response content differs between paths')
+
+
+def main():
+    """Run the serialization benchmark"""
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--repeat', type=int, default=20)
+    parser.add_argument('--rows', type=int, default=0, help='limit of rows, 0 means all rows')
+    asyncio.run(run(parser.parse_args()))
+
+
+if __name__ == '__main__':
+    main()
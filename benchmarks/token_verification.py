@@ -0,0 +1,95 @@
+"""
+Token Verification Benchmark: requests/s of an authenticated GET, in memory through ASGI (no database):
+token decoded twice (previous TokenBearer), decoded once (TOKEN_CACHE_SIZE=0) and cached (token_cache).
+Usage: python -m benchmarks.token_verification [--requests 5000]
+"""
+import argparse
+import asyncio
+import time
+
+from fastapi import FastAPI, Depends, Request
+from fastapi.security import HTTPBearer
+from httpx import ASGITransport, AsyncClient
+
+from src.auth.cache import token_cache
+from src.auth.dependencies import AccessTokenBearer
+from src.auth.utils import create_access_token, decode_token
+from src.config import Config
+
+
+class PreviousAccessTokenBearer(AccessTokenBearer):
+    """TokenBearer before the token cache: decodes the token and decodes it again to validate it"""
+
+    async def __call__(self, request: Request) -> dict:
+        creds = await HTTPBearer.__call__(self, request)
+        token_data = decode_token(creds.credentials)
+        decode_token(creds.credentials)
+        self.verify_token_data(token_data)
+        return token_data
+
+
+def create_app() -> FastAPI:
+    """
+    Application with one authenticated endpoint by verification path
+    :return: FastAPI application
+    """
+    app = FastAPI()
+
+    @app.get('/previous')
+    async def previous(token_details: dict = Depends(PreviousAccessTokenBearer())):
+        return token_details['user']
+
+    @app.get('/current')
+    async def current(token_details: dict = Depends(AccessTokenBearer())):
+        return token_details['user']
+
+    return app
+
+
+async def measure(client: AsyncClient, path: str, requests: int) -> float:
+    """
+    Request an endpoint several times
+    :param client: client bound to the ASGI application, with the Authorization header
+    :param path: endpoint path
+    :param requests: number of requests
+    :return: requests per second
+    """
+    await client.get(path)
+    begin = time.perf_counter()
+    for _ in range(requests):
+        response = await client.get(path)
+        response.raise_for_status()
+    return requests / (time.perf_counter() - begin)
+
+
+async def run(args: argparse.Namespace):
+    """
+    Print the requests/s of each verification path
+    :param args: command line arguments
+    """
+    token = create_access_token(user_data={'email': 'benchmark@example.com', 'user_uid': 'benchmark'})
+    transport = ASGITransport(app=create_app())
+    async with AsyncClient(transport=transport, base_url='http://benchmark',
+                           headers={'Authorization': f'Bearer {token}'}) as client:
+        results = {'decoded twice': await measure(client, '/previous', args.requests)}
+        token_cache.max_entries = 0
+        results['decoded once'] = await measure(client, '/current', args.requests)
+        token_cache.max_entries = Config.TOKEN_CACHE_SIZE or 1024
+        results['cached'] = await measure(client, '/current', args.requests)
+
+    print(f'{args.requests} requests, {Config.JWT_ALGORITHM}')
+    print(f'{"path":<16}{"req/s":>10}{"speedup":>10}')
+    baseline = results['decoded twice']
+    for path, requests_per_second in results.items():
+        print(f'{path:<16}{requests_per_second:>10.0f}{requests_per_second / baseline:>9.2f}x')
+
+
+def main():
+    """Run the token verification benchmark"""
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--requests', type=int, default=5000)
+    asyncio.run(run(parser.parse_args()))
+
+
+if __name__ == '__main__':
+    main()
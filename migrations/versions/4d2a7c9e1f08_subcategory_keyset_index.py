@@ -0,0 +1,32 @@
+# pylint: disable=invalid-name
+"""subcategory keyset index
+
+Revision ID: 4d2a7c9e1f08
+Revises: 9b1f4c2d7e3a
+Create Date: 2026-10-18 14:02:47.318260
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '4d2a7c9e1f08'
+down_revision: Union[str, None] = '9b1f4c2d7e3a'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_index('ix_tb_subcategory_subcategory_year_uid', 'tb_subcategory',
+                    ['subcategory', 'year', 'uid'])
+    op.drop_index('ix_tb_subcategory_subcategory_year', table_name='tb_subcategory')
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.create_index('ix_tb_subcategory_subcategory_year', 'tb_subcategory', ['subcategory', 'year'])
+    op.drop_index('ix_tb_subcategory_subcategory_year_uid', table_name='tb_subcategory')
@@ -0,0 +1,31 @@
+# pylint: disable=invalid-name
+"""subcategory read indexes
+
+Revision ID: 9b1f4c2d7e3a
+Revises: c3234b8adba7
+Create Date: 2026-10-18 13:10:22.504117
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '9b1f4c2d7e3a'
+down_revision: Union[str, None] = 'c3234b8adba7'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_index('ix_tb_subcategory_subcategory_year', 'tb_subcategory', ['subcategory', 'year'])
+    op.create_index('ix_tb_subcategory_category_uid', 'tb_subcategory', ['category_uid'])
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_tb_subcategory_category_uid', table_name='tb_subcategory')
+    op.drop_index('ix_tb_subcategory_subcategory_year', table_name='tb_subcategory')
@@ -0,0 +1,37 @@
+"""aggregate views
+
+Revision ID: b5c81e4f6a27
+Revises: 7f3e2b6a9c14
+Create Date: 2026-10-18 16:40:12.905318
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'b5c81e4f6a27'
+down_revision: Union[str, None] = '7f3e2b6a9c14'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+VIEWS = {'year': ('year',), 'product': ('product', 'year'), 'country': ('country', 'year')}
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    for group_by, columns in VIEWS.items():
+        keys = ', '.join(('subcategory', *columns))
+        op.execute(f'CREATE MATERIALIZED VIEW mv_aggregate_{group_by} AS '
+                   f'SELECT {keys}, sum(qty_product) AS qty_sum, count(qty_product) AS qty_count, '
+                   f'sum(vl_product) AS vl_sum, count(vl_product) AS vl_count '
+                   f'FROM tb_subcategory WHERE {group_by} IS NOT NULL GROUP BY {keys}')
+        op.execute(f'CREATE UNIQUE INDEX ux_mv_aggregate_{group_by} ON mv_aggregate_{group_by} ({keys})')
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    for group_by in VIEWS:
+        op.execute(f'DROP MATERIALIZED VIEW mv_aggregate_{group_by}')
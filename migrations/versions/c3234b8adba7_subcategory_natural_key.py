@@ -0,0 +1,49 @@
+"""subcategory natural key
+
+Requires PostgreSQL 15 or newer (UNIQUE NULLS NOT DISTINCT)
+
+Revision ID: c3234b8adba7
+Revises: e6da95542274
+Create Date: 2026-10-18 09:12:41.318204
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'c3234b8adba7'
+down_revision: Union[str, None] = 'e6da95542274'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # Comercio rows loaded before unique_controls have no product and unqualified repeated controls, so they
+    # never match the new keys: they are deleted and the next ingestion loads Comercio again
+    op.execute("DELETE FROM tb_subcategory WHERE subcategory = 'Comercio' AND product IS NULL")
+    # Other rows loaded before the natural key existed may repeat a key,
+    # only the most recently updated row of each key is kept
+    op.execute("""
+        DELETE FROM tb_subcategory WHERE uid IN (
+            SELECT uid FROM (
+                SELECT uid, row_number() OVER (
+                    PARTITION BY subcategory, control, product, country, year
+                    ORDER BY updated_at DESC NULLS LAST, uid
+                ) AS position
+                FROM tb_subcategory
+            ) AS ranked
+            WHERE position > 1
+        )
+    """)
+    op.create_unique_constraint('uq_subcategory_natural_key', 'tb_subcategory',
+                                ['subcategory', 'control', 'product', 'country', 'year'],
+                                postgresql_nulls_not_distinct=True)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_constraint('uq_subcategory_natural_key', 'tb_subcategory', type_='unique')
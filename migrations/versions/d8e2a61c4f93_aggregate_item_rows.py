@@ -0,0 +1,67 @@
+"""subcategory row type
+
+Revision ID: d8e2a61c4f93
+Revises: b5c81e4f6a27
+Create Date: 2026-10-18 19:05:41.217730
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'd8e2a61c4f93'
+down_revision: Union[str, None] = 'b5c81e4f6a27'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+# hierarchical subcategories (ImpVinhos and the other imp/exp files only have single rows)
+GROUPED_SUBCATEGORIES = ('Producao', 'ProcessaViniferas', 'ProcessaAmericanas', 'ProcessaMesa',
+                         'ProcessaSemclass', 'Comercio')
+# totals add the group rows and products add the items (see src.db.models.AGGREGATE_ROWS)
+ROWS = {'year': "row_type <> 'item'", 'product': "row_type <> 'group'", 'country': "row_type <> 'item'"}
+PREVIOUS_VIEWS = {'year': ('year',), 'product': ('product', 'year'), 'country': ('country', 'year')}
+VIEWS = {'year': ('year',), 'product': ('control', 'product', 'year'), 'country': ('country', 'year')}
+
+
+def drop_views():
+    """Drop the aggregate views, they depend on the tb_subcategory columns"""
+    for group_by in VIEWS:
+        op.execute(f'DROP MATERIALIZED VIEW IF EXISTS mv_aggregate_{group_by}')
+
+
+def create_views(views: dict[str, tuple[str, ...]], conditions: dict[str, str]):
+    """
+    Create the aggregate views and their unique indexes
+    :param views: key columns of each view
+    :param conditions: rows aggregated by each view
+    """
+    for group_by, columns in views.items():
+        keys = ', '.join(('subcategory', *columns))
+        op.execute(f'CREATE MATERIALIZED VIEW mv_aggregate_{group_by} AS '
+                   f'SELECT {keys}, sum(qty_product) AS qty_sum, count(qty_product) AS qty_count, '
+                   f'sum(vl_product) AS vl_sum, count(vl_product) AS vl_count '
+                   f'FROM tb_subcategory WHERE {group_by} IS NOT NULL AND {conditions[group_by]} '
+                   f'GROUP BY {keys}')
+        op.execute(f'CREATE UNIQUE INDEX ux_mv_aggregate_{group_by} ON mv_aggregate_{group_by} ({keys})')
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    drop_views()
+    op.add_column('tb_subcategory',
+                  sa.Column('row_type', sa.VARCHAR(), nullable=False, server_default='single'))
+    # the row type depends on the file order, which is not stored: the next ingestion loads these
+    # subcategories again and upsert_subcategories rewrites the row_type of their rows
+    subcategories = ', '.join(f"'{subcategory}'" for subcategory in GROUPED_SUBCATEGORIES)
+    op.execute(f'DELETE FROM tb_ingestion_state WHERE subcategory IN ({subcategories})')
+    create_views(VIEWS, ROWS)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    drop_views()
+    op.drop_column('tb_subcategory', 'row_type')
+    create_views(PREVIOUS_VIEWS, dict.fromkeys(PREVIOUS_VIEWS, 'true'))
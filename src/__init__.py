@@ -3,13 +3,20 @@ Main class of the application.
 All configuration below is used for Controller additions, cors configuration,
 Swagger and Redoc headers, etc.
 """
+from contextlib import asynccontextmanager
+
 from fastapi import FastAPI, Request
 from fastapi.staticfiles import StaticFiles
 from fastapi.templating import Jinja2Templates
+from sqlmodel.ext.asyncio.session import AsyncSession
 
-from src.auth.routes import auth_router
+from src.access_log import access_log
+from src.auth.routes import auth_router, user_service
+from src.auth.utils import password_hasher
+from src.config import Config
+from src.db.main import engine, session_factory, prewarm_pool
 from src.middleware import register_middleware
-from src.viticulture.routes import viticulture_router
+from src.viticulture.routes import viticulture_router, feign_client, job_manager, viticulture_service
 
 tags_metadata = [
     {
@@ -22,6 +29,34 @@ tags_metadata = [
     }
 ]
 
+
+async def warm_up(session: AsyncSession):
+    """
+    Hot statements prepared in every connection opened at startup
+    :param session: session of the connection being warmed
+    """
+    await user_service.get_user_by_email('', session)
+    await viticulture_service.warm_up(session)
+
+
+@asynccontextmanager
+async def life_span(fastapi_app: FastAPI):
+    """
+    Application lifespan: warms the connection pool, loads the columnar store (READ_ENGINE=memory)
+    and releases shared resources
+    """
+    await prewarm_pool(warm_up)
+    if Config.READ_ENGINE == 'memory':
+        async with session_factory() as session:
+            await viticulture_service.load_columnar(session)
+    yield
+    await job_manager.close()
+    await feign_client.close()
+    password_hasher.close()
+    await engine.dispose()
+    await access_log.close()
+
+
 app = FastAPI(
     version='1.0.0',
     title='Tech Challenge 01 - Collection API',
@@ -31,7 +66,8 @@ app = FastAPI(
     redoc_url='/documentation/redoc',
     docs_url='/documentation/swagger',
     openapi_url='/documentation/openapi.json',
-    openapi_tags=tags_metadata
+    openapi_tags=tags_metadata,
+    lifespan=life_span
 )
 
 app.mount("/site", StaticFiles(directory="site"), name="docs")
@@ -0,0 +1,119 @@
+"""
+Access Log: structured (JSON lines) access log written in batches by a background task, so requests only
+append a record to an in-memory buffer. Also measures the database time of each request for Server-Timing
+"""
+import asyncio
+import json
+import random
+import sys
+import time
+from collections import deque
+from contextvars import ContextVar
+from typing import TextIO
+
+from sqlalchemy import event
+from sqlalchemy.engine import ExecutionContext
+
+from src.config import Config
+from src.db.main import engine
+
+request_timings: ContextVar[dict | None] = ContextVar('request_timings', default=None)
+
+
+class AccessLogWriter:
+    """Buffers access records and writes them as JSON lines, ACCESS_LOG_BATCH_SIZE at a time"""
+
+    def __init__(self, stream: TextIO, sample_rate: float):
+        """
+        :param stream: output stream (stdout)
+        :param sample_rate: fraction of the requests logged, server errors (5xx) are always logged
+        """
+        self.stream = stream
+        self.sample_rate = sample_rate
+        self.dropped = 0
+        self._records: deque[dict] = deque()
+        self._ready = asyncio.Event()
+        self._task: asyncio.Task | None = None
+
+    def log(self, record: dict):
+        """
+        Buffer a record without blocking, the oldest ones are dropped when ACCESS_LOG_QUEUE_SIZE is reached
+        :param record: access data with the response status
+        """
+        if record['status'] < 500 and random.random() >= self.sample_rate:
+            return
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+        if len(self._records) >= Config.ACCESS_LOG_QUEUE_SIZE:
+            self._records.popleft()
+            self.dropped += 1
+        self._records.append(record)
+        if len(self._records) >= Config.ACCESS_LOG_BATCH_SIZE:
+            self._ready.set()
+
+    async def close(self):
+        """Stop the writer during application shutdown, writing the buffered records"""
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+        self._write(list(self._records))
+        self._records.clear()
+
+    async def _run(self):
+        """Write a batch when it is full or every ACCESS_LOG_FLUSH_INTERVAL seconds"""
+        while True:
+            try:
+                await asyncio.wait_for(self._ready.wait(), Config.ACCESS_LOG_FLUSH_INTERVAL)
+            except asyncio.TimeoutError:
+                pass
+            self._ready.clear()
+            while self._records:
+                batch = [self._records.popleft()
+                         for _ in range(min(len(self._records), Config.ACCESS_LOG_BATCH_SIZE))]
+                await asyncio.to_thread(self._write, batch)
+
+    def _write(self, batch: list[dict]):
+        if not batch:
+            return
+        self.stream.write(''.join(json.dumps(record, separators=(',', ':')) + '\n' for record in batch))
+        self.stream.flush()
+
+
+@event.listens_for(engine.sync_engine, 'before_cursor_execute')
+def start_query_timer(conn, cursor, statement, parameters, context, executemany):
+    # pylint: disable=unused-argument,too-many-arguments,too-many-positional-arguments
+    """Keep the start of the statement in its execution context, dropped with it even when it fails"""
+    if context is not None:
+        context.query_start = time.perf_counter_ns()
+
+
+@event.listens_for(engine.sync_engine, 'after_cursor_execute')
+def stop_query_timer(conn, cursor, statement, parameters, context, executemany):
+    # pylint: disable=unused-argument,too-many-arguments,too-many-positional-arguments
+    """Add the statement duration to the timings of the current request"""
+    add_query_time(context)
+
+
+@event.listens_for(engine.sync_engine, 'handle_error')
+def stop_failed_query_timer(exception_context):
+    """Add the duration of a failed statement, after_cursor_execute is not called for it"""
+    add_query_time(exception_context.execution_context)
+
+
+def add_query_time(context: ExecutionContext | None):
+    """
+    Add the time since start_query_timer to the current request
+    :param context: statement execution context, None for statements without one
+    """
+    start = getattr(context, 'query_start', None)
+    if start is None:
+        return
+    context.query_start = None
+    timings = request_timings.get()
+    if timings is not None:
+        timings['db'] += time.perf_counter_ns() - start
+        timings['queries'] += 1
+
+
+access_log = AccessLogWriter(sys.stdout, Config.ACCESS_LOG_SAMPLE_RATE)
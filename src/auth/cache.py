@@ -0,0 +1,111 @@
+"""
+Auth Caches: in-process LRU caches of verified JWT payloads, keyed by the token hash and dropped at the
+token exp claim, and of users, keyed by email and uid with a short TTL and dropped on every user write
+"""
+import hashlib
+import time
+import uuid
+from collections import OrderedDict
+
+from src.auth.schemas import UserModel
+from src.auth.utils import decode_token
+from src.config import Config
+
+
+class TokenCache:  # pylint: disable=too-few-public-methods
+    """Verified payloads by token hash, least recently used ones are evicted first"""
+
+    def __init__(self, max_entries: int):
+        """
+        :param max_entries: maximum number of cached tokens, 0 disables the cache
+        """
+        self.max_entries = max_entries
+        self.entries: OrderedDict[bytes, tuple[float, dict]] = OrderedDict()
+
+    def verify(self, token: str) -> dict:
+        """
+        Return the payload of a token verified before or verify (decode) it once and cache it
+        :param token: jwt token in str format
+        :return: dict containing values of jwt token payload
+        """
+        if self.max_entries <= 0:
+            return decode_token(token)
+        key = hashlib.sha256(token.encode('utf-8')).digest()
+        entry = self.entries.get(key)
+        if entry is not None:
+            if entry[0] > time.time():
+                self.entries.move_to_end(key)
+                return entry[1]
+            del self.entries[key]
+
+        token_data = decode_token(token)
+        if 'exp' in token_data:
+            self.entries[key] = (token_data['exp'], token_data)
+            if len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+        return token_data
+
+
+class UserCache:
+    """Users by ('email', email) and ('uid', uid), least recently used ones are evicted first"""
+
+    def __init__(self, max_entries: int, ttl: float):
+        """
+        :param max_entries: maximum number of cached keys (two by user)
+        :param ttl: seconds a user stays valid, 0 disables the cache
+        """
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.entries: OrderedDict[tuple[str, str], tuple[float, UserModel]] = OrderedDict()
+
+    def get(self, key: tuple[str, str]) -> UserModel | None:
+        """
+        Return a cached user
+        :param key: ('email', email) or ('uid', uid as str)
+        :return: user or None when it is not cached or expired
+        """
+        entry = self.entries.get(key)
+        if entry is None:
+            return None
+        if entry[0] <= time.monotonic():
+            del self.entries[key]
+            return None
+        self.entries.move_to_end(key)
+        return entry[1]
+
+    def put(self, user: UserModel):
+        """
+        Cache a user read from database by both keys
+        :param user: user data
+        """
+        if self.ttl <= 0:
+            return
+        expires = time.monotonic() + self.ttl
+        for key in self.keys(user.email, user.uid):
+            self.entries[key] = (expires, user)
+            self.entries.move_to_end(key)
+        while len(self.entries) > self.max_entries:
+            self.entries.popitem(last=False)
+
+    def invalidate(self, email: str, uid: uuid.UUID | str):
+        """
+        Drop a user, called after each committed user write
+        :param email: user email
+        :param uid: user uid
+        """
+        for key in self.keys(email, uid):
+            self.entries.pop(key, None)
+
+    @staticmethod
+    def keys(email: str, uid: uuid.UUID | str) -> tuple[tuple[str, str], tuple[str, str]]:
+        """
+        Cache keys of a user
+        :param email: user email
+        :param uid: user uid
+        :return: email and uid keys
+        """
+        return ('email', email), ('uid', str(uid))
+
+
+token_cache = TokenCache(Config.TOKEN_CACHE_SIZE)
+user_cache = UserCache(Config.USER_CACHE_SIZE, Config.USER_CACHE_TTL)
@@ -7,8 +7,8 @@ from fastapi.security import HTTPBearer
 from fastapi.security.http import HTTPAuthorizationCredentials
 from sqlmodel.ext.asyncio.session import AsyncSession
 
+from src.auth.cache import token_cache
 from src.auth.services import UserService
-from src.auth.utils import decode_token
 from src.db.main import get_session
 
 user_service = UserService()
@@ -22,31 +22,17 @@ class TokenBearer(HTTPBearer):
 
     async def __call__(self, request: Request) -> HTTPAuthorizationCredentials | dict | None:
         creds = await super().__call__(request)
-        token = creds.credentials
-        token_data = decode_token(token)
-
-        if not self.token_valid(token):
-            raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail={
-                'error': 'This token is invalid or expired',
-                'resolution': 'Please get new token'
-            })
+        # verified (signature and expiration) once, invalid or expired tokens raise 403 in decode_token
+        token_data = token_cache.verify(creds.credentials)
         self.verify_token_data(token_data)
         return token_data
 
-    def token_valid(self, token: str) -> bool:
-        """
-        Check if jwt token is valid or not
-        :param token: token in str format
-        :return: Result as bool value
-        """
-        return decode_token(token) is not None
-
     def verify_token_data(self, token_data):
         """Default method without implementation"""
         raise NotImplementedError('Please override this method in child classes')
 
 
-class AccessTokenBearer(TokenBearer):
+class AccessTokenBearer(TokenBearer):  # pylint: disable=too-few-public-methods
     """AccessTokenBearer features for token validations"""
 
     def verify_token_data(self, token_data: dict) -> None:
@@ -55,7 +41,7 @@ class AccessTokenBearer(TokenBearer):
                                 detail='Please provide an access token')
 
 
-class RefreshTokenBearer(TokenBearer):
+class RefreshTokenBearer(TokenBearer):  # pylint: disable=too-few-public-methods
     """RefreshTokenBearer features for token validations"""
 
     def verify_token_data(self, token_data: dict) -> None:
@@ -73,4 +59,4 @@ async def get_current_user(token_details: dict = Depends(AccessTokenBearer()),
     :return: user data after get in database
     """
     user_email = token_details['user']['email']
-    return await user_service.get_user_by_email(user_email, session)
+    return await user_service.get_cached_user_by_email(user_email, session)
@@ -40,13 +40,13 @@ async def create_user_account(user_data: UserCreateModel, bg_tasks: BackgroundTa
 @auth_router.post('/login')
 async def login_user(login_data: UserLoginModel, session: AsyncSession = Depends(get_session)):
     """Allow a user login the application after email verification"""
-    user = await user_service.get_user_by_email(login_data.email, session)
+    user = await user_service.get_cached_user_by_email(login_data.email, session)
     if user is not None:
         msg = 'You need to validate your account before login. Please, check your email!'
         if not user.is_verified:
             raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail=msg)
 
-        password_valid = verify_password(login_data.password, user.password)
+        password_valid = await verify_password(login_data.password, user.password)
         if password_valid:
             user_data = {'email': user.email, 'user_uid': str(user.uid)}
             access_token = create_access_token(user_data=user_data)
@@ -4,7 +4,8 @@ User Service: responsible for database integration
 from sqlmodel import select
 from sqlmodel.ext.asyncio.session import AsyncSession
 
-from src.auth.schemas import UserCreateModel
+from src.auth.cache import user_cache
+from src.auth.schemas import UserCreateModel, UserModel
 from src.auth.utils import get_password_hash
 from src.db.models import User
 
@@ -23,6 +24,23 @@ class UserService:
         result = await session.scalars(statement)
         return result.first()
 
+    async def get_cached_user_by_email(self, email: str, session: AsyncSession) -> UserModel | None:
+        """
+        Get user data based in email as param, cached for USER_CACHE_TTL seconds (see cache.user_cache),
+        used by the read-only paths (current user and login), writes use get_user_by_email
+        :param email: user email in str format
+        :param session: current application session
+        :return: user data or None when it is not registered
+        """
+        user = user_cache.get(('email', email))
+        if user is None:
+            db_user = await self.get_user_by_email(email, session)
+            if db_user is None:
+                return None
+            user = UserModel.model_validate(db_user, from_attributes=True)
+            user_cache.put(user)
+        return user
+
     async def user_exists(self, email: str, session: AsyncSession) -> bool:
         """
         Validate if email is already registered in database
@@ -42,10 +60,11 @@ class UserService:
         """
         user_data_dict = user_data.model_dump()
         new_user = User(**user_data_dict)
-        new_user.password = get_password_hash(user_data_dict['password'])
+        new_user.password = await get_password_hash(user_data_dict['password'])
 
         session.add(new_user)
         await session.commit()
+        user_cache.invalidate(new_user.email, new_user.uid)
         return new_user
 
     async def update_user(self, user: User, user_data: dict, session: AsyncSession):
@@ -59,4 +78,5 @@ class UserService:
         for k, v in user_data.items():
             setattr(user, k, v)
         await session.commit()
+        user_cache.invalidate(user.email, user.uid)
         return user
@@ -1,9 +1,13 @@
 """
 Util class responsible JWT token validations
 """
+import asyncio
 import logging
 import uuid
+from concurrent.futures import ThreadPoolExecutor
+from collections.abc import Callable
 from datetime import datetime, timedelta
+from typing import Any
 
 import bcrypt
 import jwt
@@ -18,23 +22,67 @@ serializer = URLSafeTimedSerializer(secret_key=Config.JWT_SECRET, salt='email-va
 ACCESS_TOKEN_EXPIRY = 7200
 
 
-def verify_password(plain_password: str, hashed_password: str) -> bool:
+class PasswordHasher:
+    """Runs bcrypt in a dedicated thread pool, so hashing never blocks the event loop"""
+
+    def __init__(self, workers: int, queue_size: int):
+        """
+        :param workers: number of threads running bcrypt
+        :param queue_size: calls allowed to wait for a free thread, above it requests get 503
+        """
+        self.workers = workers
+        self.queue_size = queue_size
+        self.pending = 0
+        self._pool: ThreadPoolExecutor | None = None
+
+    async def run(self, function: Callable[..., Any], *args) -> Any:
+        """
+        Run a bcrypt function in the pool
+        :param function: bcrypt.checkpw or bcrypt.hashpw
+        :param args: function arguments
+        :return: function result
+        """
+        if self.pending >= self.workers + self.queue_size:
+            raise HTTPException(status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                                detail='Too many password checks in progress. Try again later!')
+        if self._pool is None:
+            self._pool = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix='bcrypt')
+        self.pending += 1
+        try:
+            return await asyncio.get_running_loop().run_in_executor(self._pool, function, *args)
+        finally:
+            self.pending -= 1
+
+    def close(self):
+        """Release the threads during application shutdown"""
+        if self._pool is not None:
+            self._pool.shutdown(wait=False, cancel_futures=True)
+            self._pool = None
+
+
+password_hasher = PasswordHasher(Config.BCRYPT_WORKERS, Config.BCRYPT_QUEUE_SIZE)
+
+
+async def verify_password(plain_password: str, hashed_password: str) -> bool:
     """
     Verify if the password used during login process and returns a bool result
     :param plain_password: password used in login form
     :param hashed_password: password saved in database
     :return: bool result
     """
-    return bcrypt.checkpw(plain_password.encode("utf-8"), hashed_password.encode("utf-8"))
+    return await password_hasher.run(bcrypt.checkpw, plain_password.encode("utf-8"),
+                                     hashed_password.encode("utf-8"))
 
 
-def get_password_hash(password: str) -> str:
+async def get_password_hash(password: str) -> str:
     """
-    Get a string password and use
+    Get a string password and use bcrypt with BCRYPT_ROUNDS as cost
     :param password: string password
     :return: hashed password
     """
-    return bcrypt.hashpw(password.encode("utf-8"), bcrypt.gensalt()).decode("utf-8")
+    hashed = await password_hasher.run(bcrypt.hashpw, password.encode("utf-8"),
+                                       bcrypt.gensalt(rounds=Config.BCRYPT_ROUNDS))
+    return hashed.decode("utf-8")
 
 
 def create_access_token(user_data: dict, expiry: timedelta = None, refresh: bool = False):
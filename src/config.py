@@ -1,6 +1,9 @@
 """
 Configuration class responsible for getting all env parameters of the application
 """
+import os
+from typing import Literal
+
 from pydantic_settings import BaseSettings, SettingsConfigDict
 
 
@@ -20,6 +23,44 @@ class Settings(BaseSettings):
     USE_CREDENTIALS: bool = True
     VALIDATE_CERTS: bool = True
     DOMAIN_URL: str
+    EMBRAPA_URL: str = 'http://vitibrasil.cnpuv.embrapa.br/download/{}.csv'
+    INGESTION_BATCH_SIZE: int = 5000
+    EMBRAPA_TIMEOUT: float = 10
+    EMBRAPA_CONCURRENCY: int = 4
+    EMBRAPA_MAX_CONNECTIONS: int = 8
+    EMBRAPA_MAX_KEEPALIVE_CONNECTIONS: int = 4
+    PARSER_WORKERS: int = os.cpu_count() or 2
+    PIPELINE_QUEUE_SIZE: int = 2
+    STREAM_CHUNK_SIZE: int = 65536
+    INGESTION_WORKERS: int = 2
+    INGESTION_QUEUE_SIZE: int = 10
+    INGESTION_JOB_HISTORY: int = 100
+    PAGE_SIZE: int = 100
+    MAX_PAGE_SIZE: int = 1000
+    CACHE_TTL: float = 300
+    CACHE_MAX_BYTES: int = 64 * 1024 * 1024
+    FAST_RESPONSES: bool = False
+    EXPORT_BATCH_SIZE: int = 10000
+    READ_ENGINE: Literal['postgres', 'memory'] = 'postgres'
+    COLUMNAR_CHECK_INTERVAL: float = 5
+    TOKEN_CACHE_SIZE: int = 1024
+    USER_CACHE_SIZE: int = 2048
+    USER_CACHE_TTL: float = 30
+    BCRYPT_ROUNDS: int = 12
+    BCRYPT_WORKERS: int = 2
+    BCRYPT_QUEUE_SIZE: int = 16
+    DB_POOL_SIZE: int = 5
+    DB_POOL_MIN_SIZE: int = 2
+    DB_MAX_OVERFLOW: int = 10
+    DB_POOL_TIMEOUT: float = 30
+    DB_POOL_RECYCLE: int = 1800
+    DB_POOL_PRE_PING: bool = True
+    DB_STATEMENT_CACHE_SIZE: int = 100
+    DB_POOL_METRICS_WINDOW: int = 1000
+    ACCESS_LOG_SAMPLE_RATE: float = 1.0
+    ACCESS_LOG_BATCH_SIZE: int = 100
+    ACCESS_LOG_FLUSH_INTERVAL: float = 1.0
+    ACCESS_LOG_QUEUE_SIZE: int = 10000
 
     model_config = SettingsConfigDict(env_file='.env', extra='ignore')
 
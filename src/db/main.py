@@ -1,16 +1,88 @@
 """
 Class responsible for application session
 """
-from typing import AsyncGenerator
+import asyncio
+import logging
+import time
+from collections import deque
+from collections.abc import Awaitable, Callable
+from typing import AsyncGenerator, Any
 
+from sqlalchemy import exc, make_url
 from sqlalchemy.ext.asyncio import AsyncEngine
 from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import AsyncAdaptedQueuePool
 from sqlmodel import create_engine
 from sqlmodel.ext.asyncio.session import AsyncSession
 
 from src.config import Config
 
-engine = AsyncEngine(create_engine(url=Config.DATABASE_URL, echo=False))
+
+class PoolMetrics:
+    """Checkout wait times (last DB_POOL_METRICS_WINDOW checkouts) and saturation of the connection pool"""
+
+    def __init__(self, window: int):
+        """
+        :param window: number of recent checkouts used for the wait times
+        """
+        self.waits: deque[float] = deque(maxlen=window)
+        self.counters = {'checkouts': 0, 'timeouts': 0}
+        self.peak_checked_out = 0
+
+    def checkout(self, seconds: float, checked_out: int):
+        """
+        Record a checkout
+        :param seconds: time waiting for a free connection (or opening a new one)
+        :param checked_out: connections in use after the checkout
+        """
+        self.waits.append(seconds)
+        self.counters['checkouts'] += 1
+        self.peak_checked_out = max(self.peak_checked_out, checked_out)
+
+    def timeout(self):
+        """Record a checkout that gave up after DB_POOL_TIMEOUT seconds"""
+        self.counters['timeouts'] += 1
+
+    def stats(self, pool: AsyncAdaptedQueuePool) -> dict:
+        """
+        Current pool usage and recent wait times, used to size DB_POOL_SIZE and DB_MAX_OVERFLOW
+        :param pool: engine pool
+        :return: counters, connections, saturation (checked out / capacity) and wait times in ms
+        """
+        capacity = pool.size() + Config.DB_MAX_OVERFLOW
+        checked_out = pool.checkedout()
+        waits = sorted(self.waits)
+        return {**self.counters, 'size': pool.size(), 'max_overflow': Config.DB_MAX_OVERFLOW,
+                'checked_out': checked_out, 'checked_in': pool.checkedin(), 'overflow': pool.overflow(),
+                'saturation': checked_out / capacity, 'peak_saturation': self.peak_checked_out / capacity,
+                'wait_ms_avg': sum(waits) / len(waits) * 1000 if waits else 0.0,
+                'wait_ms_p99': waits[min(len(waits) - 1, int(len(waits) * 0.99))] * 1000 if waits else 0.0,
+                'wait_ms_max': waits[-1] * 1000 if waits else 0.0}
+
+
+class MeasuredQueuePool(AsyncAdaptedQueuePool):
+    """AsyncAdaptedQueuePool recording how long each checkout waits in pool_metrics"""
+
+    def _do_get(self):
+        begin = time.perf_counter()
+        try:
+            connection = super()._do_get()
+        except exc.TimeoutError:
+            pool_metrics.timeout()
+            raise
+        pool_metrics.checkout(time.perf_counter() - begin, self.checkedout())
+        return connection
+
+
+pool_metrics = PoolMetrics(Config.DB_POOL_METRICS_WINDOW)
+# the prepared statement cache size is an asyncpg connect argument, other drivers reject it
+connect_args = {'prepared_statement_cache_size': Config.DB_STATEMENT_CACHE_SIZE} \
+    if make_url(Config.DATABASE_URL).get_driver_name() == 'asyncpg' else {}
+engine = AsyncEngine(create_engine(
+    url=Config.DATABASE_URL, echo=False, poolclass=MeasuredQueuePool, pool_size=Config.DB_POOL_SIZE,
+    max_overflow=Config.DB_MAX_OVERFLOW, pool_timeout=Config.DB_POOL_TIMEOUT,
+    pool_recycle=Config.DB_POOL_RECYCLE, pool_pre_ping=Config.DB_POOL_PRE_PING, connect_args=connect_args))
+session_factory = sessionmaker(bind=engine, class_=AsyncSession, expire_on_commit=False)
 
 
 async def get_session() -> AsyncGenerator[AsyncSession, None]:
@@ -18,6 +90,37 @@ async def get_session() -> AsyncGenerator[AsyncSession, None]:
     This method is responsible for the postgres+asyncpg session.
     For more information see sessionmaker documentation.
     """
-    session = sessionmaker(class_=AsyncSession, expire_on_commit=False)
-    async with session(bind=engine) as session:
+    async with session_factory() as session:
         yield session
+
+
+async def prewarm_pool(warm_up: Callable[[AsyncSession], Awaitable[Any]]):
+    """
+    Open DB_POOL_MIN_SIZE connections at startup and run the hot statements in each one,
+    so the first requests find them connected and with those statements already prepared.
+    A failure is logged and does not stop the startup
+    :param warm_up: coroutine function running the hot statements in a session
+    """
+    size = min(Config.DB_POOL_MIN_SIZE, Config.DB_POOL_SIZE)
+    if size <= 0:
+        return
+    # sessions keep their connections until all of them ran the statements, so each one opens a new connection
+    opened = asyncio.Barrier(size)
+
+    async def open_connection():
+        try:
+            async with session_factory() as session:
+                await warm_up(session)
+                await opened.wait()
+        except Exception:
+            # the other sessions stop waiting too (BrokenBarrierError)
+            await opened.abort()
+            raise
+
+    results = await asyncio.gather(*[open_connection() for _ in range(size)], return_exceptions=True)
+    failures = [result for result in results
+                if isinstance(result, Exception) and not isinstance(result, asyncio.BrokenBarrierError)]
+    if failures:
+        # startup goes on, connections are opened on demand
+        logging.error('Connection pool warm up failed (%d of %d connections): %s', len(failures), size,
+                      failures[0])
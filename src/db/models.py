@@ -6,8 +6,19 @@ from datetime import datetime
 from typing import List, Optional
 
 import sqlalchemy.dialects.postgresql as pg
+from sqlalchemy import DDL, BigInteger, Float, Index, Integer, String, UniqueConstraint, column, event, table
+from sqlalchemy.sql.expression import TableClause
 from sqlmodel import SQLModel, Field, Column, Relationship
 
+SUBCATEGORY_NATURAL_KEY = 'uq_subcategory_natural_key'
+AGGREGATE_COLUMNS = {'qty_sum': Float, 'qty_count': BigInteger, 'vl_sum': Float, 'vl_count': BigInteger}
+AGGREGATE_VIEWS = {'year': ('year',), 'product': ('control', 'product', 'year'),
+                   'country': ('country', 'year')}
+# totals add the group rows (the Embrapa totals, their items are not always detailed) and products add
+# the items, so a group and its items are never counted together (see parsers.row_types)
+AGGREGATE_ROWS = {'year': "row_type <> 'item'", 'product': "row_type <> 'group'",
+                  'country': "row_type <> 'item'"}
+
 
 class User(SQLModel, table=True):
     """User entity"""
@@ -34,7 +45,7 @@ class Category(SQLModel, table=True):
     uid: uuid.UUID = Field(sa_column=Column(pg.UUID, nullable=False, primary_key=True, default=uuid.uuid4))
     category: str = Field(sa_column=Column(pg.VARCHAR, nullable=False))
     subcategories: List['SubCategory'] = Relationship(back_populates='category',
-                                                      sa_relationship_kwargs={'lazy': 'selectin'})
+                                                      sa_relationship_kwargs={'lazy': 'raise'})
     created_at: datetime = Field(sa_column=Column(pg.TIMESTAMP, default=datetime.now))
     updated_at: datetime = Field(sa_column=Column(pg.TIMESTAMP, default=datetime.now))
 
@@ -45,6 +56,10 @@ class Category(SQLModel, table=True):
 class SubCategory(SQLModel, table=True):
     """Embrapa Viticulture with subcategories"""
     __tablename__ = 'tb_subcategory'
+    __table_args__ = (UniqueConstraint('subcategory', 'control', 'product', 'country', 'year',
+                                       name=SUBCATEGORY_NATURAL_KEY, postgresql_nulls_not_distinct=True),
+                      Index('ix_tb_subcategory_subcategory_year_uid', 'subcategory', 'year', 'uid'),
+                      Index('ix_tb_subcategory_category_uid', 'category_uid'))
     uid: uuid.UUID = Field(sa_column=Column(pg.UUID, nullable=False, primary_key=True, default=uuid.uuid4))
     subcategory: str = Field(sa_column=Column(pg.VARCHAR, nullable=False))
     control: str = Field(sa_column=Column(pg.VARCHAR))
@@ -53,6 +68,7 @@ class SubCategory(SQLModel, table=True):
     qty_product: int = Field(sa_column=Column(pg.FLOAT))
     vl_product: float = Field(sa_column=Column(pg.FLOAT))
     year: int = Field(sa_column=Column(pg.INTEGER))
+    row_type: str = Field(sa_column=Column(pg.VARCHAR, nullable=False, server_default='single'))
     category_uid: uuid.UUID | None = Field(default=None, foreign_key="tb_category.uid")
     category: Optional['Category'] =Relationship(back_populates='subcategories')
     created_at: datetime = Field(sa_column=Column(pg.TIMESTAMP, default=datetime.now))
@@ -60,3 +76,53 @@ class SubCategory(SQLModel, table=True):
 
     def __repr__(self):
         return f'<SubCategory {self.category}>'
+
+
+class IngestionState(SQLModel, table=True):
+    """Last load of each subcategory, written in the same transaction as its data"""
+    __tablename__ = 'tb_ingestion_state'
+    subcategory: str = Field(sa_column=Column(pg.VARCHAR, nullable=False, primary_key=True))
+    rows: int = Field(sa_column=Column(pg.INTEGER, nullable=False))
+    source: Optional[str] = Field(sa_column=Column(pg.VARCHAR))
+    content_hash: Optional[str] = Field(sa_column=Column(pg.VARCHAR))
+    loaded_at: datetime = Field(sa_column=Column(pg.TIMESTAMP, nullable=False, default=datetime.now))
+
+    def __repr__(self):
+        return f'<IngestionState {self.subcategory}>'
+
+
+
+def aggregate_view(group_by: str) -> TableClause:
+    """
+    Materialized view with the totals of the tb_subcategory rows selected by AGGREGATE_ROWS by subcategory
+    and AGGREGATE_VIEWS columns, refreshed after every write (see ViticultureService.refresh_aggregates)
+    :param group_by: AGGREGATE_VIEWS key
+    :return: lightweight table used in queries
+    """
+    keys = [column(name, Integer if name == 'year' else String) for name in AGGREGATE_VIEWS[group_by]]
+    return table(f'mv_aggregate_{group_by}', column('subcategory', String), *keys,
+                 *[column(name, type_) for name, type_ in AGGREGATE_COLUMNS.items()])
+
+
+def aggregate_view_ddl(group_by: str) -> list[str]:
+    """
+    Statements creating an aggregate view and the unique index required by REFRESH ... CONCURRENTLY
+    :param group_by: AGGREGATE_VIEWS key
+    :return: SQL statements
+    """
+    keys = ', '.join(('subcategory', *AGGREGATE_VIEWS[group_by]))
+    return [f'CREATE MATERIALIZED VIEW IF NOT EXISTS mv_aggregate_{group_by} AS '
+            f'SELECT {keys}, sum(qty_product) AS qty_sum, count(qty_product) AS qty_count, '
+            f'sum(vl_product) AS vl_sum, count(vl_product) AS vl_count '
+            f'FROM tb_subcategory WHERE {group_by} IS NOT NULL AND {AGGREGATE_ROWS[group_by]} '
+            f'GROUP BY {keys}',
+            f'CREATE UNIQUE INDEX IF NOT EXISTS ux_mv_aggregate_{group_by} '
+            f'ON mv_aggregate_{group_by} ({keys})']
+
+
+# metadata.create_all (used without migrations) also creates the views, drop_all removes them first
+for _group_by in AGGREGATE_VIEWS:
+    for _statement in aggregate_view_ddl(_group_by):
+        event.listen(SQLModel.metadata, 'after_create', DDL(_statement))
+    event.listen(SQLModel.metadata, 'before_drop',
+                 DDL(f'DROP MATERIALIZED VIEW IF EXISTS mv_aggregate_{_group_by}'))
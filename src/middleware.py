@@ -8,6 +8,8 @@ from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.requests import Request
 
+from src.access_log import access_log, request_timings
+
 logger = logging.getLogger('uvicorn.access')
 logger.disabled = True
 
@@ -17,14 +19,20 @@ def register_middleware(app: FastAPI):
 
     @app.middleware('http')
     async def custom_logging(req: Request, call_next):
-        begin = time.time()
-        res = await call_next(req)
-        total_time = time.time() - begin
-        host = req.client.host
-        port = req.client.port
-        code = res.status_code
-        msg = f'{host}:{port} - {req.method} - {req.url.path} - {code} after {total_time}'
-        print(msg)
+        begin = time.perf_counter_ns()
+        timings = {'db': 0, 'queries': 0}
+        token = request_timings.set(timings)
+        try:
+            res = await call_next(req)
+        finally:
+            request_timings.reset(token)
+        total_ms = (time.perf_counter_ns() - begin) / 1_000_000
+        db_ms = timings['db'] / 1_000_000
+        queries = timings['queries']
+        res.headers['Server-Timing'] = f'app;dur={total_ms:.3f}, db;dur={db_ms:.3f};desc="{queries} queries"'
+        access_log.log({'time': time.time(), 'client': f'{req.client.host}:{req.client.port}',
+                        'method': req.method, 'path': req.url.path, 'status': res.status_code,
+                        'duration_ms': round(total_ms, 3), 'db_ms': round(db_ms, 3), 'queries': queries})
         return res
 
     app.add_middleware(CORSMiddleware, allow_origins=['*'], allow_methods=['*'],
@@ -0,0 +1,106 @@
+"""
+Query Cache: in-process TTL + LRU cache of ViticultureService read results, limited by a memory budget.
+Every write bumps the dataset version, so results read before it are never served again. The version is
+kept by each process: with several workers the others keep serving their results until CACHE_TTL expires
+"""
+import time
+from collections import OrderedDict
+from collections.abc import Awaitable, Callable, Hashable
+from typing import Any
+
+from pydantic import BaseModel
+
+from src.config import Config
+
+
+class QueryCache:
+    """Read results by (dataset version, key), least recently used ones are evicted first"""
+
+    def __init__(self, max_bytes: int, ttl: float):
+        """
+        :param max_bytes: memory budget, measured as the estimated JSON size of the cached results
+        :param ttl: seconds a result stays valid, 0 disables the cache
+        """
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.version = 0
+        self.size = 0
+        self.entries: OrderedDict[tuple, tuple[float, int, Any]] = OrderedDict()
+        self.counters = {'hits': 0, 'misses': 0, 'evictions': 0, 'expirations': 0, 'invalidations': 0}
+
+    async def get_or_load(self, key: Hashable, loader: Callable[[], Awaitable[Any]]) -> Any:
+        """
+        Return the cached result of the current dataset version or load and cache it (when not None)
+        :param key: method name and arguments
+        :param loader: coroutine function reading the database
+        :return: cached or loaded result
+        """
+        version = self.version
+        entry = self.entries.get((version, key))
+        if entry is not None:
+            if entry[0] > time.monotonic():
+                self.entries.move_to_end((version, key))
+                self.counters['hits'] += 1
+                return entry[2]
+            self._remove((version, key))
+            self.counters['expirations'] += 1
+
+        self.counters['misses'] += 1
+        value = await loader()
+        # a write committed while loading makes the result stale before it is even cached,
+        # None (not found) is never cached, so a row created by a write of another process is found at once
+        if value is not None and version == self.version and self.ttl > 0:
+            self._add((version, key), value)
+        return value
+
+    def invalidate(self):
+        """
+        Bump the dataset version and drop every cached result, called after each committed write
+        (only in this process, see the module docstring)
+        """
+        self.version += 1
+        self.entries.clear()
+        self.size = 0
+        self.counters['invalidations'] += 1
+
+    def stats(self) -> dict:
+        """
+        Counters used to size the cache
+        :return: counters, entries, used and maximum bytes and current dataset version
+        """
+        return {**self.counters, 'entries': len(self.entries), 'bytes': self.size,
+                'max_bytes': self.max_bytes, 'ttl': self.ttl, 'version': self.version}
+
+    def _add(self, key: tuple, value: Any):
+        size = estimate_size(value)
+        if size > self.max_bytes:
+            return
+        self.entries[key] = (time.monotonic() + self.ttl, size, value)
+        self.size += size
+        while self.size > self.max_bytes:
+            self._remove(next(iter(self.entries)))
+            self.counters['evictions'] += 1
+
+    def _remove(self, key: tuple):
+        _, size, _ = self.entries.pop(key)
+        self.size -= size
+
+
+def estimate_size(value: Any) -> int:
+    """
+    Approximate size of a cached result without serializing it: lists are measured by their first item
+    times their length, as the rows of a result have the same fields, tuples item by item
+    :param value: pydantic model, list of them, tuple (e.g. page items and cursor), scalar or None
+    :return: approximate size in bytes of its JSON representation
+    """
+    if isinstance(value, BaseModel):
+        return sum(len(name) + 4 + estimate_size(getattr(value, name))
+                   for name in type(value).model_fields) + 2
+    if isinstance(value, list):
+        return (estimate_size(value[0]) + 1) * len(value) + 2 if value else 2
+    if isinstance(value, tuple):
+        return sum(estimate_size(item) + 1 for item in value) + 2
+    return len(str(value))
+
+
+query_cache = QueryCache(Config.CACHE_MAX_BYTES, Config.CACHE_TTL)
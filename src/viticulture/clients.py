@@ -1,23 +1,21 @@
 """
 Embrapa Client class: responsible for external communication with Embrapa website
 """
-import json
-import re
-from io import StringIO
+from collections.abc import AsyncIterator
+from concurrent.futures import ProcessPoolExecutor
 
 import httpx
-import pandas as pd
 from fastapi import status
 from fastapi.exceptions import HTTPException
 from httpx import AsyncClient, Response
-from pandas import DataFrame
 from sqlmodel.ext.asyncio.session import AsyncSession
 
-from src.db.models import Category
-from src.viticulture.enums import CategoryEnum
-from src.viticulture.schemas import CategoryCreateModel
+from src.config import Config
+from src.viticulture.downloads import CacheEntry, DownloadCache, content_hash
+from src.viticulture.enums import CategoryEnum, ProcessModeEnum
+from src.viticulture.pipeline import IngestionPipeline
+from src.viticulture.schemas import CategoryCreateModel, SubCategoryProgressModel
 from src.viticulture.services import ViticultureService
-from src.viticulture.utils import URL, menus, FILE_PATH, new_cols
 
 viticulture_service = ViticultureService()
 
@@ -25,50 +23,117 @@ viticulture_service = ViticultureService()
 class EmbrapaClient:
     """Class for processing Embrapa external communication"""
 
-    async def process_api_mode(self, category: CategoryEnum, session: AsyncSession):
+    def __init__(self):
+        self._client: AsyncClient | None = None
+        self._process_pool: ProcessPoolExecutor | None = None
+        self.cache = DownloadCache()
+
+    def get_client(self) -> AsyncClient:
+        """
+        Shared AsyncClient with keep-alive and connection limits, created on first use
+        :return: pooled AsyncClient
+        """
+        if self._client is None or self._client.is_closed:
+            limits = httpx.Limits(max_connections=Config.EMBRAPA_MAX_CONNECTIONS,
+                                  max_keepalive_connections=Config.EMBRAPA_MAX_KEEPALIVE_CONNECTIONS)
+            self._client = httpx.AsyncClient(limits=limits, timeout=Config.EMBRAPA_TIMEOUT)
+        return self._client
+
+    def get_process_pool(self) -> ProcessPoolExecutor:
+        """
+        Process pool used for CSV parsing, created on first use
+        :return: ProcessPoolExecutor
+        """
+        if self._process_pool is None:
+            self._process_pool = ProcessPoolExecutor(max_workers=Config.PARSER_WORKERS)
+        return self._process_pool
+
+    async def close(self):
+        """Close the shared AsyncClient and the parser process pool"""
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+        if self._process_pool is not None:
+            self._process_pool.shutdown(cancel_futures=True)
+            self._process_pool = None
+
+    async def process_api_mode(self, category: CategoryEnum, session: AsyncSession,
+                               progress: dict[str, SubCategoryProgressModel] | None = None,
+                               delta: bool = False):
         """
         Process all data based in a selected category using external API to
-        retrieve all data and persists in database
+        retrieve all data and persists in database.
+        Downloads run concurrently and each subcategory is persisted as soon as it is parsed.
+        Subcategories already saved whose download did not change since the last load are skipped
         :param category: category as Enum
         :param session: current application session
+        :param progress: optional dict updated with progress counters by subcategory
+        :param delta: when True saved rows are compared and only new or changed rows are written
         :return:
         """
-        async with httpx.AsyncClient() as client:
-            try:
-                for option in menus[category.name]:
-                    response = await self.get_external_data(client, option)
-                    single_category = await self.check_category_creation(category, session)
-                    data_dict = await self.data_to_dict(single_category, response, option)
-                    await viticulture_service.create_subcategories(data_dict, session)
-                return {'message': 'All data saved successfully in database.'}
-            except Exception as e:
-                raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e)) from e
+        pipeline = IngestionPipeline(self, ProcessModeEnum.API, delta, progress)
+        return await self.run_pipeline(pipeline, [category], session)
 
-    async def process_file_mode(self, category: CategoryEnum, session: AsyncSession):
+    async def process_file_mode(self, category: CategoryEnum, session: AsyncSession,
+                                progress: dict[str, SubCategoryProgressModel] | None = None,
+                                delta: bool = False):
         """
         Process all data based in a selected category using internal CSV file to
         retrieve all data and persists in database
         :param category: category as Enum
         :param session: current application session
+        :param progress: optional dict updated with progress counters by subcategory
+        :param delta: when True saved rows are compared and only new or changed rows are written
         :return:
         """
+        pipeline = IngestionPipeline(self, ProcessModeEnum.FILE, delta, progress)
+        return await self.run_pipeline(pipeline, [category], session)
+
+    async def process_stream_mode(self, category: CategoryEnum, session: AsyncSession,
+                                  progress: dict[str, SubCategoryProgressModel] | None = None,
+                                  delta: bool = False):
+        """
+        Process all data based in a selected category using external API without buffering
+        whole files: each response is read chunk by chunk, parsed incrementally and written
+        in batches with a fixed number of records (committed once by subcategory)
+        :param category: category as Enum
+        :param session: current application session
+        :param progress: optional dict updated with progress counters by subcategory
+        :param delta: when True saved rows are compared and only new or changed rows are written
+        :return:
+        """
+        pipeline = IngestionPipeline(self, ProcessModeEnum.STREAM, delta, progress)
+        return await self.run_pipeline(pipeline, [category], session)
+
+    async def process_all_mode(self, mode: ProcessModeEnum, session: AsyncSession,
+                               progress: dict[str, SubCategoryProgressModel] | None = None,
+                               delta: bool = False):
+        """
+        Process all subcategories of every category in a single staged pipeline: fetch
+        (API or FILE), parse in a process pool and bulk write in database. Stages are
+        connected by bounded queues and subcategories already saved in database are skipped
+        (or upserted in delta mode)
+        :param mode: process mode as Enum
+        :param session: current application session
+        :param progress: optional dict updated with progress counters by subcategory
+        :param delta: when True saved rows are compared and only new or changed rows are written
+        :return: counters, skipped subcategories and seconds spent in each stage
+        """
+        pipeline = IngestionPipeline(self, mode, delta, progress)
+        return await self.run_pipeline(pipeline, list(CategoryEnum), session)
+
+    async def run_pipeline(self, pipeline: IngestionPipeline, categories: list[CategoryEnum],
+                           session: AsyncSession):
+        """
+        Create missing categories and run the ingestion pipeline for all of them
+        :param pipeline: configured ingestion pipeline
+        :param categories: list of categories as Enum
+        :param session: current application session
+        :return: pipeline result
+        """
         try:
-            for option in menus[category.name]:
-                with open(FILE_PATH.format(option), 'r', encoding='utf-8') as file:
-                    content = file.read()
-                    single_category = await self.check_category_creation(category, session)
-
-                    separator = ','
-                    if re.search('\t', content):
-                        separator = '\t'
-                    elif re.search(';', content):
-                        separator = ';'
-
-                    content = content.replace('\x88', '')
-                    df = pd.read_csv(StringIO(content), sep=separator, engine='python')
-                    data_dict = await self.process_dict(single_category, df, option)
-                    await viticulture_service.create_subcategories(data_dict, session)
-            return {'message': 'All data saved successfully in database.'}
+            saved = [await self.check_category_creation(category, session) for category in categories]
+            return await pipeline.run(saved, session)
         except Exception as e:
             raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e)) from e
 
@@ -79,90 +144,56 @@ class EmbrapaClient:
         :param session: current application session
         :return: category model
         """
-        single_category = await viticulture_service.get_category(category.name, session)
+        single_category = await viticulture_service.get_category(category.name, session, cached=False)
         if not single_category:
             dict_category = CategoryCreateModel(**{'category': category.name})
             single_category = await viticulture_service.create_category(dict_category, session)
         return single_category
 
-    async def get_external_data(self, client: AsyncClient, subcategory: str) -> Response:
+    async def download(self, client: AsyncClient, subcategory: str) -> tuple[bytes, CacheEntry, bool]:
+        """
+        Download a subcategory with a conditional request based in the download cache.
+        A 304 response reuses the cached content
+        :param client: AsyncClient variable
+        :param subcategory: selected subcategory in str format
+        :return: raw content, cache entry and whether content changed since the last load
+        """
+        cached = self.cache.get_entry(subcategory)
+        response = await self.get_external_data(client, subcategory,
+                                                self.cache.conditional_headers(subcategory))
+        if response.status_code == status.HTTP_304_NOT_MODIFIED:
+            return self.cache.read_content(subcategory), cached, False
+
+        entry = CacheEntry(etag=response.headers.get('ETag'),
+                           last_modified=response.headers.get('Last-Modified'),
+                           sha256=content_hash(response.content))
+        return response.content, entry, cached is None or cached.sha256 != entry.sha256
+
+    async def stream(self, client: AsyncClient, subcategory: str) -> AsyncIterator[bytes]:
+        """
+        Stream a subcategory CSV without buffering the whole response
+        :param client: AsyncClient variable
+        :param subcategory: selected subcategory in str format
+        :return: async iterator of raw chunks
+        """
+        async with client.stream('GET', Config.EMBRAPA_URL.format(subcategory)) as response:
+            if response.status_code != status.HTTP_200_OK:
+                error_msg = 'An error occurred during external request. Try again later!'
+                raise HTTPException(status_code=status.HTTP_502_BAD_GATEWAY, detail=error_msg)
+            async for chunk in response.aiter_bytes(Config.STREAM_CHUNK_SIZE):
+                yield chunk
+
+    async def get_external_data(self, client: AsyncClient, subcategory: str,
+                                headers: dict | None = None) -> Response:
         """
         Process all requested data and returns a valid object for database persistence
         :param client: AsyncClient variable
         :param subcategory: selected subcategory in str format
+        :param headers: optional request headers (conditional request)
         :return: response
         """
-        response = await client.get(url=URL.format(subcategory), timeout=10)
-        if response.status_code != 200:
+        response = await client.get(url=Config.EMBRAPA_URL.format(subcategory), headers=headers)
+        if response.status_code not in {status.HTTP_200_OK, status.HTTP_304_NOT_MODIFIED}:
             error_msg = 'An error occurred during external request. Try again later!'
             raise HTTPException(status_code=status.HTTP_502_BAD_GATEWAY, detail=error_msg)
         return response
-
-    async def data_to_dict(self, data: Category, response: Response, subcategory: str):
-        """
-        Convert received data in dict
-        :param data: Category data
-        :param response: response from AsyncClient
-        :param subcategory: variable in str format
-        :return: dict result
-        """
-        separator = ','
-        if re.search('\t', response.text):
-            separator = '\t'
-        elif re.search(';', response.text):
-            separator = ';'
-
-        content = response.content.decode('utf-8', errors='ignore')
-        content = content.replace('\x81', '')
-        df = pd.read_csv(StringIO(content), sep=separator, engine='python')
-        return await self.process_dict(data, df, subcategory)
-
-    async def process_dict(self, data: Category, df: DataFrame, subcategory: str):
-        """
-        Switch between category mode for dictionary conversion
-        :param data: Category data
-        :param df: dataframe from external client
-        :param subcategory: subcategory name is str
-        :return: dict format
-        """
-        if data.category in {'IMPORTACAO', 'EXPORTACAO'}:
-            return await self.process_imp_exp(data, df, subcategory)
-        return await self.process_others(data, df, subcategory)
-
-    async def process_others(self, data: Category, df: DataFrame, subcategory: str):
-        """
-        Process all csv data when category is not IMPORTACAO or EXPORTACAO
-        :param data: Category data
-        :param df: dataframe from external client
-        :param subcategory: subcategory name is str
-        :return: dict format
-        """
-        cols = df.columns.values.tolist()
-        new_df = pd.melt(df, id_vars=cols[0:3], var_name='year', value_name='qty_product')
-        new_df['category_uid'] = str(data.uid)
-        new_df['subcategory'] = subcategory
-        new_df['qty_product'] = new_df['qty_product'].replace({'nd': 0, '*': 0, '+': 0}).astype(str)
-        new_df['qty_product'] = new_df['qty_product'].str.replace(',', '.').astype(float)
-        new_df = new_df.rename(columns=new_cols)
-        return json.loads(new_df.to_json(orient='records'))
-
-    async def process_imp_exp(self, data: Category, df: DataFrame, subcategory: str):
-        """
-        Process all csv data when category is IMPORTACAO or EXPORTACAO
-        :param data: Category data
-        :param df: dataframe from external client
-        :param subcategory: subcategory name is str
-        :return: dict format
-        """
-        df_countries = df.iloc[:, 1:2]
-        df_kg = df_countries.join(df.iloc[:, 2::2])
-        df_vl = df_countries.join(df.iloc[:, 3::2])
-        df_kg_melt = df_kg.melt(id_vars='País', var_name='year', value_name='qty_product')
-        df_vl_melt = df_vl.melt(id_vars='País', var_name='year', value_name='vl_product')
-        df_kg_melt['year'] = df_kg_melt['year'].str[:4].astype('int32')
-        df_vl_melt['year'] = df_vl_melt['year'].str[:4].astype('int32')
-        new_df = df_kg_melt.merge(df_vl_melt)
-        new_df['category_uid'] = str(data.uid)
-        new_df['subcategory'] = subcategory
-        new_df = new_df.rename(columns=new_cols)
-        return json.loads(new_df.to_json(orient='records'))
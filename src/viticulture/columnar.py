@@ -0,0 +1,247 @@
+"""
+Columnar Store: optional in-memory copy of tb_subcategory (READ_ENGINE=memory) kept as numpy arrays,
+with dictionary encoded text columns and rows sorted by (subcategory, year, uid), answering the read
+queries without touching Postgres. It is rebuilt after every write and swapped in a single assignment.
+Each snapshot keeps the dataset version it was loaded from, so writes of other processes are noticed too
+"""
+import asyncio
+import bisect
+import time
+import uuid
+
+import numpy as np
+import pandas as pd
+from sqlmodel import select
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+from src.db.models import SubCategory
+from src.viticulture.enums import AggregateMetricEnum, RowTypeEnum
+from src.viticulture.schemas import SubCategoryModel, AggregateQueryModel, AggregateModel, AggregateRowModel
+from src.viticulture.utils import SUBCATEGORY_FIELDS
+
+COLUMNS = ('uid', *SUBCATEGORY_FIELDS, 'created_at', 'updated_at')
+ENCODED_COLUMNS = ('subcategory', 'control', 'product', 'country', 'row_type')
+NUMERIC_COLUMNS = {'qty_product': np.float64, 'vl_product': np.float64, 'year': np.int64}
+LOAD_BATCH_SIZE = 50000
+
+
+class ColumnarSnapshot:
+    """Immutable arrays of one load, never changed after built"""
+
+    def __init__(self, data: pd.DataFrame):
+        """
+        :param data: all rows with COLUMNS
+        """
+        data = data.sort_values(['subcategory', 'year', 'uid'], ignore_index=True)
+        self.columns: dict[str, np.ndarray] = {}
+        self.categories: dict[str, np.ndarray] = {}
+        for name in COLUMNS:
+            if name in ENCODED_COLUMNS:
+                encoded = pd.Categorical(data[name])
+                self.columns[name] = encoded.codes
+                self.categories[name] = np.asarray(encoded.categories, dtype=object)
+            elif name in NUMERIC_COLUMNS:
+                self.columns[name] = pd.to_numeric(data[name]).to_numpy(dtype=NUMERIC_COLUMNS[name])
+            else:
+                self.columns[name] = np.asarray(data[name].astype(object).where(data[name].notna(), None))
+        self.years = self.columns['year']
+        self.ranges = self._ranges(data)
+
+    @staticmethod
+    def _ranges(data: pd.DataFrame) -> dict[str | tuple[str, int], tuple[int, int]]:
+        """
+        Sorted (subcategory, year) index
+        :param data: sorted rows
+        :return: (start, stop) of every subcategory and of every (subcategory, year)
+        """
+        ranges = {}
+        for key, positions in data.groupby(['subcategory', 'year'], sort=False).indices.items():
+            ranges[key] = (int(positions[0]), int(positions[-1]) + 1)
+            start, _ = ranges.get(key[0], ranges[key])
+            ranges[key[0]] = (start, int(positions[-1]) + 1)
+        return ranges
+
+    def year_range(self, subcategory: str, from_year: int | None, to_year: int | None) -> tuple[int, int]:
+        """
+        Positions of the rows of a subcategory between two years (inclusive)
+        :param subcategory: SubCategory in str format
+        :param from_year: first year or None
+        :param to_year: last year or None
+        :return: (start, stop)
+        """
+        start, stop = self.ranges.get(subcategory, (0, 0))
+        years = self.years[start:stop]
+        if to_year is not None:
+            stop = start + int(np.searchsorted(years, to_year, 'right'))
+        if from_year is not None:
+            start += int(np.searchsorted(years, from_year))
+        return start, stop
+
+    def text(self, name: str, position: int) -> str | None:
+        """
+        Decode a dictionary encoded value
+        :param name: one of ENCODED_COLUMNS
+        :param position: row position
+        :return: text or None
+        """
+        code = self.columns[name][position]
+        return None if code < 0 else self.categories[name][code]
+
+    def code(self, name: str, value: str) -> int:
+        """
+        Encode a value
+        :param name: one of ENCODED_COLUMNS
+        :param value: text
+        :return: its code or -1 when no row has it
+        """
+        matches = np.flatnonzero(self.categories[name] == value)
+        return int(matches[0]) if len(matches) else -1
+
+    def group_codes(self, group_by: str, start: int, stop: int) -> tuple[np.ndarray, np.ndarray]:
+        """
+        Aggregate group of each row and the rows added to it, selected like models.AGGREGATE_ROWS
+        :param group_by: AGGREGATE_VIEWS key
+        :param start: first position
+        :param stop: position after the last one
+        :return: group codes and mask of the selected rows
+        """
+        codes = self.years[start:stop] if group_by == 'year' else self.columns[group_by][start:stop]
+        if group_by == 'product':
+            # products are grouped by control too (NULL included) like mv_aggregate_product, the same name
+            # is used in several groups
+            controls = self.columns['control'][start:stop].astype(np.int64) + 1
+            codes = codes.astype(np.int64) * (len(self.categories['control']) + 1) + controls
+        excluded = RowTypeEnum.GROUP if group_by == 'product' else RowTypeEnum.ITEM
+        selected = (self.columns[group_by][start:stop] >= 0) \
+            & (self.columns['row_type'][start:stop] != self.code('row_type', excluded.value))
+        return codes, selected
+
+    def model(self, position: int) -> SubCategoryModel:
+        """
+        Row as DTO
+        :param position: row position
+        :return: SubCategoryModel
+        """
+        values = {name: self.text(name, position) for name in ENCODED_COLUMNS}
+        for name in ('qty_product', 'vl_product'):
+            value = float(self.columns[name][position])
+            values[name] = None if np.isnan(value) else value
+        return SubCategoryModel(**values, year=int(self.years[position]),
+                                category_uid=self.columns['category_uid'][position],
+                                created_at=self.columns['created_at'][position],
+                                updated_at=self.columns['updated_at'][position])
+
+
+class ColumnarStore:
+    """Holds the current snapshot, reloaded after each ingestion and delete"""
+
+    def __init__(self):
+        self.snapshot: ColumnarSnapshot | None = None
+        self.version: str | None = None
+        self.checked_at = 0.0
+        self._lock = asyncio.Lock()
+
+    def check_due(self, interval: float) -> bool:
+        """
+        Whether the dataset version should be read again, the first caller of each interval gets True
+        :param interval: seconds between version checks
+        :return: True when the last check is older than interval
+        """
+        now = time.monotonic()
+        if now - self.checked_at < interval:
+            return False
+        self.checked_at = now
+        return True
+
+    async def reload(self, session: AsyncSession, version: str | None):
+        """
+        Read tb_subcategory (server-side cursor), build a new snapshot and swap it atomically,
+        requests running meanwhile keep using the previous one
+        :param session: current application session
+        :param version: dataset version read before the rows (see ViticultureService.get_dataset_version)
+        """
+        async with self._lock:
+            statement = (select(*[getattr(SubCategory, name) for name in COLUMNS])
+                         .execution_options(yield_per=LOAD_BATCH_SIZE))
+            result = await session.stream(statement)
+            frames = [pd.DataFrame(rows, columns=list(COLUMNS))
+                      async for rows in result.partitions(LOAD_BATCH_SIZE)]
+            data = pd.concat(frames, ignore_index=True) if frames else pd.DataFrame(columns=list(COLUMNS))
+            self.snapshot = await asyncio.to_thread(ColumnarSnapshot, data)
+            self.version = version
+            self.checked_at = time.monotonic()
+
+    def get_all_subcategories(self, subcategory: str, year: int) -> list[SubCategoryModel]:
+        """
+        Get all data by subcategory and year
+        :param subcategory: SubCategory in str format
+        :param year: integer value
+        :return: rows ordered by uid
+        """
+        snapshot = self.snapshot
+        start, stop = snapshot.ranges.get((subcategory, year), (0, 0))
+        return [snapshot.model(position) for position in range(start, stop)]
+
+    def get_subcategories_page(self, subcategory: str, year: int, limit: int,
+                               after: uuid.UUID | None) -> tuple[list[SubCategoryModel], uuid.UUID | None]:
+        """
+        Get a page of data by subcategory and year ordered by uid, like the database keyset pagination
+        :param subcategory: SubCategory in str format
+        :param year: integer value
+        :param limit: page size
+        :param after: uid of the last row of the previous page or None for the first one
+        :return: page rows and the uid of the last one when there are more pages
+        """
+        snapshot = self.snapshot
+        start, stop = snapshot.ranges.get((subcategory, year), (0, 0))
+        if after is not None:
+            start = bisect.bisect_right(snapshot.columns['uid'], after, start, stop)
+        end = min(start + limit, stop)
+        items = [snapshot.model(position) for position in range(start, end)]
+        return items, snapshot.columns['uid'][end - 1] if end < stop else None
+
+    def get_aggregate(self, subcategory: str, params: AggregateQueryModel) -> AggregateModel:
+        """
+        Get the totals (or averages) of a subcategory grouped by year, product or country, adding the rows
+        selected by models.AGGREGATE_ROWS like ViticultureService.get_aggregate
+        :param subcategory: SubCategory in str format
+        :param params: group_by, metric and the optional year range (from, to)
+        :return: one row by group ordered by key
+        """
+        snapshot = self.snapshot
+        start, stop = snapshot.year_range(subcategory, params.from_year, params.to_year)
+        group_by = params.group_by.value
+        codes, selected = snapshot.group_codes(group_by, start, stop)
+        keys, first, groups = np.unique(codes[selected], return_index=True, return_inverse=True)
+        quantities, values = [aggregate(snapshot.columns[name][start:stop][selected], groups, len(keys),
+                                        params.metric) for name in ('qty_product', 'vl_product')]
+        rows = [AggregateRowModel(key=int(key) if group_by == 'year' else snapshot.text(group_by, position),
+                                  control=(snapshot.text('control', position)
+                                           if group_by == 'product' else None),
+                                  qty_product=quantity, vl_product=value)
+                for key, position, quantity, value in zip(keys, start + np.flatnonzero(selected)[first],
+                                                          quantities, values)]
+        if group_by == 'product':
+            rows.sort(key=lambda row: (row.key, row.control is None, row.control or ''))
+        return AggregateModel(subcategory=subcategory, group_by=params.group_by, metric=params.metric,
+                              rows=rows)
+
+
+def aggregate(values: np.ndarray, groups: np.ndarray, size: int, metric: AggregateMetricEnum) -> list:
+    """
+    Sum or average by group ignoring missing values, like SQL sum() and avg()
+    :param values: values of the selected rows
+    :param groups: group of each value
+    :param size: number of groups
+    :param metric: SUM or AVG
+    :return: result by group, None when a group has only missing values
+    """
+    present = ~np.isnan(values)
+    sums = np.bincount(groups, np.where(present, values, 0.0), size)
+    counts = np.bincount(groups, present, size)
+    if metric == AggregateMetricEnum.AVG:
+        sums = sums / np.maximum(counts, 1)
+    return [None if count == 0 else float(total) for total, count in zip(sums, counts)]
+
+
+columnar_store = ColumnarStore()
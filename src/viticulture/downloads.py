@@ -0,0 +1,91 @@
+"""
+Download Cache: responsible for keeping the last persisted Embrapa CSV of each subcategory on disk,
+allowing conditional requests (ETag / Last-Modified) and content hash comparison
+"""
+import hashlib
+import os
+from typing import Optional
+
+from pydantic import BaseModel
+
+from src.viticulture.utils import CACHE_PATH
+
+
+class CacheEntry(BaseModel):
+    """Metadata of a cached download"""
+    etag: Optional[str] = None
+    last_modified: Optional[str] = None
+    sha256: str
+
+
+class DownloadCache:
+    """On-disk cache of raw downloads keyed by subcategory"""
+
+    def __init__(self, path: str = CACHE_PATH):
+        self.path = path
+
+    def get_entry(self, subcategory: str) -> CacheEntry | None:
+        """
+        Get the metadata of the cached download
+        :param subcategory: subcategory name in str format
+        :return: cache entry or None when subcategory was never cached
+        """
+        try:
+            with open(self._file(subcategory, 'json'), 'r', encoding='utf-8') as file:
+                return CacheEntry.model_validate_json(file.read())
+        except (OSError, ValueError):
+            return None
+
+    def conditional_headers(self, subcategory: str) -> dict:
+        """
+        Build If-None-Match / If-Modified-Since headers based in the cached download
+        :param subcategory: subcategory name in str format
+        :return: dict with request headers
+        """
+        entry = self.get_entry(subcategory)
+        if entry is None or not os.path.exists(self._file(subcategory, 'csv')):
+            return {}
+        headers = {}
+        if entry.etag:
+            headers['If-None-Match'] = entry.etag
+        if entry.last_modified:
+            headers['If-Modified-Since'] = entry.last_modified
+        return headers
+
+    def read_content(self, subcategory: str) -> bytes:
+        """
+        Read the cached raw content of a subcategory
+        :param subcategory: subcategory name in str format
+        :return: raw CSV content
+        """
+        with open(self._file(subcategory, 'csv'), 'rb') as file:
+            return file.read()
+
+    def store(self, subcategory: str, content: bytes, entry: CacheEntry):
+        """
+        Save raw content and metadata of a subcategory, replacing the previous files atomically
+        :param subcategory: subcategory name in str format
+        :param content: raw CSV content
+        :param entry: metadata of the download
+        """
+        os.makedirs(self.path, exist_ok=True)
+        self._write(self._file(subcategory, 'csv'), content)
+        self._write(self._file(subcategory, 'json'), entry.model_dump_json().encode('utf-8'))
+
+    def _file(self, subcategory: str, extension: str) -> str:
+        return os.path.join(self.path, f'{subcategory}.{extension}')
+
+    def _write(self, path: str, content: bytes):
+        temporary = f'{path}.tmp'
+        with open(temporary, 'wb') as file:
+            file.write(content)
+        os.replace(temporary, path)
+
+
+def content_hash(content: bytes) -> str:
+    """
+    Hash used to detect unchanged downloads
+    :param content: raw CSV content
+    :return: sha256 hex digest
+    """
+    return hashlib.sha256(content).hexdigest()
@@ -36,3 +36,43 @@ class ProcessModeEnum(str, Enum):
     """Enumeration for processing external data mode"""
     API = 'API'
     FILE = 'FILE'
+    STREAM = 'STREAM'
+
+
+class JobStatusEnum(str, Enum):
+    """Enumeration for background ingestion job status"""
+    PENDING = 'PENDING'
+    RUNNING = 'RUNNING'
+    DONE = 'DONE'
+    FAILED = 'FAILED'
+
+
+class AggregateGroupEnum(str, Enum):
+    """Enumeration for aggregation columns (one materialized view each)"""
+    YEAR = 'year'
+    PRODUCT = 'product'
+    COUNTRY = 'country'
+
+
+class AggregateMetricEnum(str, Enum):
+    """Enumeration for aggregation functions"""
+    SUM = 'sum'
+    AVG = 'avg'
+
+
+class ExportFormatEnum(str, Enum):
+    """Enumeration for dataset export formats"""
+    PARQUET = 'parquet'
+    ARROW = 'arrow'
+    CSV = 'csv'
+
+
+class RowTypeEnum(str, Enum):
+    """
+    Enumeration for the position of a row in the Embrapa groups (e.g. VINHO DE MESA with Tinto,
+    Branco, Rosado): GROUP rows hold the total of the ITEM rows below them, SINGLE rows have no group
+    nor items
+    """
+    GROUP = 'group'
+    ITEM = 'item'
+    SINGLE = 'single'
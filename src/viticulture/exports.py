@@ -0,0 +1,149 @@
+"""
+Dataset Exports: responsible for streaming tb_subcategory as Parquet, Arrow IPC or gzip CSV.
+Rows are read through a server-side cursor in batches and every batch is encoded and sent
+before the next one is read, so memory stays flat whatever the size of the export
+"""
+import asyncio
+import csv
+import io
+import zlib
+from collections.abc import AsyncIterator
+
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+from src.config import Config
+from src.db.main import session_factory
+from src.viticulture.enums import ExportFormatEnum
+from src.viticulture.services import ViticultureService, SUBCATEGORY_COLUMNS
+
+UUID_COLUMNS = ('uid', 'category_uid')
+SCHEMA = pa.schema([('uid', pa.string()), ('subcategory', pa.string()), ('control', pa.string()),
+                    ('product', pa.string()), ('country', pa.string()), ('qty_product', pa.float64()),
+                    ('vl_product', pa.float64()), ('year', pa.int32()), ('category_uid', pa.string()),
+                    ('row_type', pa.string()), ('created_at', pa.timestamp('us')),
+                    ('updated_at', pa.timestamp('us'))])
+MEDIA_TYPES = {ExportFormatEnum.PARQUET: 'application/vnd.apache.parquet',
+               ExportFormatEnum.ARROW: 'application/vnd.apache.arrow.stream',
+               ExportFormatEnum.CSV: 'application/gzip'}
+EXTENSIONS = {ExportFormatEnum.PARQUET: 'parquet', ExportFormatEnum.ARROW: 'arrows',
+              ExportFormatEnum.CSV: 'csv.gz'}
+
+viticulture_service = ViticultureService()
+
+
+class ChunkSink(io.RawIOBase):
+    """Write-only file that hands out what was written so far, keeping the total position for pyarrow"""
+
+    def __init__(self):
+        super().__init__()
+        self.chunks: list[bytes] = []
+        self.position = 0
+
+    def writable(self) -> bool:
+        return True
+
+    def write(self, data) -> int:
+        self.chunks.append(bytes(data))
+        self.position += len(data)
+        return len(data)
+
+    def tell(self) -> int:
+        return self.position
+
+    def drain(self) -> bytes:
+        """
+        Bytes written since the last drain
+        :return: encoded content
+        """
+        content = b''.join(self.chunks)
+        self.chunks = []
+        return content
+
+
+class ArrowExportWriter:
+    """Encode batches as Parquet row groups or Arrow IPC stream record batches"""
+
+    def __init__(self, export_format: ExportFormatEnum, version: str):
+        """
+        :param export_format: PARQUET or ARROW
+        :param version: dataset version saved in the schema metadata
+        """
+        self.sink = ChunkSink()
+        schema = SCHEMA.with_metadata({'dataset_version': version})
+        if export_format == ExportFormatEnum.PARQUET:
+            self.writer = pq.ParquetWriter(pa.PythonFile(self.sink, mode='w'), schema)
+        else:
+            self.writer = pa.ipc.new_stream(pa.PythonFile(self.sink, mode='w'), schema)
+        self.schema = schema
+
+    def write(self, rows: list[tuple]) -> bytes:
+        """
+        Encode a batch of rows
+        :param rows: rows with SUBCATEGORY_COLUMNS
+        :return: encoded content
+        """
+        columns = [[str(value) for value in values] if name in UUID_COLUMNS else values
+                   for name, values in zip(SUBCATEGORY_COLUMNS, zip(*rows))]
+        arrays = [pa.array(values, type=field.type) for values, field in zip(columns, self.schema)]
+        self.writer.write_batch(pa.RecordBatch.from_arrays(arrays, schema=self.schema))
+        return self.sink.drain()
+
+    def close(self) -> bytes:
+        """
+        Finish the file (Parquet footer or Arrow end of stream)
+        :return: encoded content
+        """
+        self.writer.close()
+        return self.sink.drain()
+
+
+class CsvExportWriter:
+    """Encode batches as gzip compressed CSV, with the dataset version in the first line"""
+
+    def __init__(self, version: str):
+        """
+        :param version: dataset version written as a comment before the header
+        """
+        self.compressor = zlib.compressobj(wbits=zlib.MAX_WBITS | 16)
+        self.header = f'# dataset_version={version}\n{",".join(SUBCATEGORY_COLUMNS)}\n'
+
+    def write(self, rows: list[tuple]) -> bytes:
+        """
+        Encode a batch of rows
+        :param rows: rows with SUBCATEGORY_COLUMNS
+        :return: compressed content
+        """
+        text = io.StringIO(self.header)
+        text.seek(0, io.SEEK_END)
+        self.header = ''
+        csv.writer(text, lineterminator='\n').writerows(rows)
+        return self.compressor.compress(text.getvalue().encode('utf-8'))
+
+    def close(self) -> bytes:
+        """
+        Finish the gzip stream
+        :return: compressed content
+        """
+        return self.compressor.compress(self.header.encode('utf-8')) + self.compressor.flush()
+
+
+async def export_dataset(export_format: ExportFormatEnum, subcategory: list[str],
+                         version: str) -> AsyncIterator[bytes]:
+    """
+    Stream the selected subcategories in the given format, used as StreamingResponse content.
+    It has its own session, the request session is closed before the response is sent
+    :param export_format: PARQUET, ARROW or CSV
+    :param subcategory: subcategories to be exported
+    :param version: dataset version (see ViticultureService.get_dataset_version)
+    :return: iterator of encoded content
+    """
+    if export_format == ExportFormatEnum.CSV:
+        writer = CsvExportWriter(version)
+    else:
+        writer = ArrowExportWriter(export_format, version)
+    async with session_factory() as session:
+        async for rows in viticulture_service.stream_subcategories(subcategory, session,
+                                                                   Config.EXPORT_BATCH_SIZE):
+            yield await asyncio.to_thread(writer.write, rows)
+    yield writer.close()
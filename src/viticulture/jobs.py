@@ -0,0 +1,111 @@
+"""
+Ingestion Jobs: responsible for running Embrapa ingestion in background with a bounded worker pool
+"""
+import asyncio
+import logging
+import uuid
+from collections import OrderedDict
+from datetime import datetime
+
+from fastapi import status
+from fastapi.exceptions import HTTPException
+
+from src.config import Config
+from src.db.main import session_factory
+from src.viticulture.clients import EmbrapaClient
+from src.viticulture.enums import CategoryEnum, JobStatusEnum, ProcessModeEnum
+from src.viticulture.schemas import JobModel
+
+ALL_CATEGORIES = 'ALL'
+
+
+class IngestionJobManager:
+    """Keeps ingestion jobs in memory and runs them with a fixed number of workers"""
+
+    def __init__(self, client: EmbrapaClient):
+        self.client = client
+        self.jobs: OrderedDict[uuid.UUID, JobModel] = OrderedDict()
+        self._queue: asyncio.Queue | None = None
+        self._workers: list[asyncio.Task] = []
+
+    def submit(self, category: CategoryEnum | None, mode: ProcessModeEnum, delta: bool = False) -> JobModel:
+        """
+        Register a new ingestion job and send it to the worker pool
+        :param category: category as Enum or None for all categories
+        :param mode: process mode as Enum
+        :param delta: when True saved rows are compared and only new or changed rows are written
+        :return: the new job in PENDING status
+        """
+        if self._queue is None:
+            self._queue = asyncio.Queue(maxsize=Config.INGESTION_QUEUE_SIZE)
+            self._workers = [asyncio.create_task(self._worker()) for _ in range(Config.INGESTION_WORKERS)]
+
+        job = JobModel(category=category.name if category else ALL_CATEGORIES, mode=mode, delta=delta)
+        try:
+            self._queue.put_nowait(job)
+        except asyncio.QueueFull as e:
+            raise HTTPException(status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                                detail='Too many ingestion jobs in queue. Try again later!') from e
+
+        self.jobs[job.uid] = job
+        while len(self.jobs) > Config.INGESTION_JOB_HISTORY:
+            self.jobs.popitem(last=False)
+        return job
+
+    def get_job(self, uid: uuid.UUID) -> JobModel | None:
+        """
+        Get a job by uid
+        :param uid: job uid
+        :return: job or None
+        """
+        return self.jobs.get(uid)
+
+    async def close(self):
+        """Cancel all workers during application shutdown, running jobs are marked as FAILED"""
+        for worker in self._workers:
+            worker.cancel()
+        await asyncio.gather(*self._workers, return_exceptions=True)
+        self._workers = []
+        self._queue = None
+
+    async def _worker(self):
+        """Consume jobs from the queue, one at a time"""
+        while True:
+            job = await self._queue.get()
+            try:
+                await self._run(job)
+            finally:
+                self._queue.task_done()
+
+    async def _run(self, job: JobModel):
+        """
+        Run a single job with its own database session
+        :param job: job in PENDING status
+        """
+        job.status = JobStatusEnum.RUNNING
+        job.started_at = datetime.now()
+        try:
+            async with session_factory() as session:
+                if job.category == ALL_CATEGORIES:
+                    job.result = await self.client.process_all_mode(job.mode, session, job.subcategories,
+                                                                    job.delta)
+                elif job.mode == ProcessModeEnum.FILE:
+                    job.result = await self.client.process_file_mode(CategoryEnum[job.category], session,
+                                                                     job.subcategories, job.delta)
+                elif job.mode == ProcessModeEnum.STREAM:
+                    job.result = await self.client.process_stream_mode(CategoryEnum[job.category], session,
+                                                                       job.subcategories, job.delta)
+                else:
+                    job.result = await self.client.process_api_mode(CategoryEnum[job.category], session,
+                                                                    job.subcategories, job.delta)
+            job.status = JobStatusEnum.DONE
+        except asyncio.CancelledError:
+            job.status = JobStatusEnum.FAILED
+            job.error = 'Job cancelled during application shutdown'
+            raise
+        except Exception as e:
+            logging.error('Ingestion job %s failed: %s', job.uid, e)
+            job.status = JobStatusEnum.FAILED
+            job.error = str(e.detail) if isinstance(e, HTTPException) else str(e)
+        finally:
+            job.finished_at = datetime.now()
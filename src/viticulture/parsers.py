@@ -0,0 +1,316 @@
+"""
+Embrapa CSV parsers: pure functions used to convert raw CSV content into database records.
+All functions are synchronous and picklable, so they can run inside a process pool.
+Parsed data is handed off as a columnar dataframe with SUBCATEGORY_FIELDS columns.
+StreamParser converts content chunk by chunk, in batches with a fixed number of records
+"""
+import codecs
+import time
+import uuid
+from io import BytesIO, StringIO
+
+import numpy as np
+import pandas as pd
+from pandas import DataFrame
+
+from src.viticulture.enums import RowTypeEnum
+from src.viticulture.utils import new_cols, SUBCATEGORY_FIELDS
+
+TEXT_FIELDS = ('subcategory', 'control', 'product', 'country')
+NUMERIC_FIELDS = ('qty_product', 'vl_product')
+ROW_TYPES = tuple(row_type.value for row_type in RowTypeEnum)
+IMP_EXP_CATEGORIES = {'IMPORTACAO', 'EXPORTACAO'}
+STRAY_BYTES = (b'\xc2\x81', b'\xc2\x88')
+STRAY_CHARS = ('\x81', '\x88')
+
+
+def detect_separator(header: str) -> str:
+    """
+    Guess the CSV separator looking only at the header line
+    :param header: first line of the CSV content
+    :return: separator character
+    """
+    if '\t' in header:
+        return '\t'
+    if ';' in header:
+        return ';'
+    return ','
+
+
+def read_csv(content: bytes) -> DataFrame:
+    """
+    Load raw CSV content as a dataframe with pandas C engine.
+    Stray \\x81 / \\x88 characters are removed from the bytes before decoding
+    :param content: raw CSV content
+    :return: wide dataframe
+    """
+    for stray in STRAY_BYTES:
+        content = content.replace(stray, b'')
+    header = content.split(b'\n', 1)[0].decode('utf-8-sig', errors='ignore')
+    return pd.read_csv(BytesIO(content), sep=detect_separator(header), engine='c',
+                       encoding='utf-8', encoding_errors='ignore')
+
+
+def parse_content(content: bytes, category: str, category_uid: str, subcategory: str) -> DataFrame:
+    """
+    Convert raw CSV content in validated columns ready for database persistence
+    :param content: raw CSV content
+    :param category: category name in str format
+    :param category_uid: category uid in str format
+    :param subcategory: subcategory name is str
+    :return: dataframe with SUBCATEGORY_FIELDS columns, seconds spent in each step in attrs['timings']
+    """
+    begin = time.perf_counter()
+    df = read_csv(content)
+    read = time.perf_counter()
+    df = process_dict(df, category, category_uid, subcategory)
+    melt = time.perf_counter()
+    df = validate_columns(df)
+    df.attrs['timings'] = {'read': read - begin, 'melt': melt - read, 'validate': time.perf_counter() - melt}
+    return df
+
+
+def process_dict(df: DataFrame, category: str, category_uid: str, subcategory: str,
+                 state: dict | None = None) -> DataFrame:
+    """
+    Switch between category mode for columnar conversion
+    :param df: dataframe from external client
+    :param category: category name in str format
+    :param category_uid: category uid in str format
+    :param subcategory: subcategory name is str
+    :param state: optional state shared between batches of the same file (see unique_controls)
+    :return: long format dataframe
+    """
+    if category in IMP_EXP_CATEGORIES:
+        return process_imp_exp(df, category_uid, subcategory)
+    return process_others(df, category_uid, subcategory, state)
+
+
+def validate_columns(df: DataFrame) -> DataFrame:
+    """
+    Validate and type every column once (vectorized), keeping only SUBCATEGORY_FIELDS.
+    Missing optional columns are filled with None
+    :param df: long format dataframe
+    :return: dataframe with SUBCATEGORY_FIELDS columns
+    """
+    df = df.reindex(columns=list(SUBCATEGORY_FIELDS))
+    for name in TEXT_FIELDS:
+        df[name] = df[name].astype(object).where(df[name].notna(), None)
+    for name in NUMERIC_FIELDS:
+        df[name] = pd.to_numeric(df[name]).astype('float64')
+
+    if df['subcategory'].isna().any():
+        raise ValueError('Subcategory is required for every row')
+    year = pd.to_numeric(df['year'])
+    if year.isna().any() or (year % 1 != 0).any():
+        raise ValueError('Year shall be an integer value for every row')
+    df['year'] = year.astype('int64')
+    for value in df['category_uid'].unique():
+        uuid.UUID(str(value))
+    if not df['row_type'].isin(ROW_TYPES).all():
+        raise ValueError(f'Row type shall be one of {", ".join(ROW_TYPES)} for every row')
+    return df
+
+
+def process_others(df: DataFrame, category_uid: str, subcategory: str,
+                   state: dict | None = None) -> DataFrame:
+    """
+    Process all csv data when category is not IMPORTACAO or EXPORTACAO
+    :param df: dataframe from external client
+    :param category_uid: category uid in str format
+    :param subcategory: subcategory name is str
+    :param state: optional state shared between batches of the same file (see unique_controls)
+    :return: long format dataframe
+    """
+    cols = df.columns.values.tolist()
+    state = {} if state is None else state
+    df['row_type'] = row_types(df[cols[1]], state)
+    df[cols[1]] = unique_controls(df, cols[1], cols[2], state)
+    new_df = to_long(df, [*cols[1:3], 'row_type'], cols[3:], qty_product=df[cols[3:]].to_numpy())
+    if new_df['qty_product'].dtype == object:
+        quantities = new_df['qty_product'].astype(str).replace({'nd': '0', '*': '0', '+': '0'})
+        new_df['qty_product'] = quantities.str.replace(',', '.').astype(float)
+    new_df['category_uid'] = category_uid
+    new_df['subcategory'] = subcategory
+    return new_df.rename(columns=new_cols)
+
+
+def to_long(df: DataFrame, id_vars: list[str], years: list[str], **values: np.ndarray) -> DataFrame:
+    """
+    Same result of pandas melt (year by year, rows in file order) built directly from numpy arrays
+    :param df: dataframe from external client
+    :param id_vars: columns repeated for every year
+    :param years: year column names (only the first 4 characters are used)
+    :param values: value columns in wide format, with one column by year
+    :return: long format dataframe
+    """
+    data = {name: np.tile(df[name].to_numpy(), len(years)) for name in id_vars}
+    data['year'] = np.repeat(np.array([int(year[:4]) for year in years], dtype='int64'), len(df))
+    for name, matrix in values.items():
+        data[name] = matrix.T.ravel()
+    return DataFrame(data)
+
+
+def parent_rows(controls: pd.Series) -> pd.Series:
+    """
+    Group rows of the Embrapa files have an upper case control (e.g. VINHO DE MESA) or none at all
+    (OUTROS PRODUTOS COMERCIALIZADOS in Comercio)
+    :param controls: control column
+    :return: whether each row starts a group
+    """
+    return controls.isna() | controls.astype(str).str.isupper()
+
+
+def row_types(controls: pd.Series, state: dict) -> np.ndarray:
+    """
+    Classify the rows of a file in file order: rows after a group row are its items, a group row
+    followed by items is a GROUP (its values are their total) and any other row is SINGLE
+    (e.g. VINHO FRIZANTE in Comercio, a group without items). The last row must not be a group row
+    unless the file ends with it (see StreamParser)
+    :param controls: control column before unique_controls
+    :param state: when the file is processed in batches, keeps whether a group row was already seen
+    :return: RowTypeEnum value of each row
+    """
+    parents = parent_rows(controls).to_numpy(dtype=bool)
+    grouped = np.logical_or.accumulate(parents) | state.get('grouped', False)
+    items = grouped & ~parents
+    if len(parents):
+        state['grouped'] = bool(grouped[-1])
+    groups = parents & np.append(items[1:], False)
+    return np.where(items, RowTypeEnum.ITEM.value, np.where(groups, RowTypeEnum.GROUP.value,
+                                                             RowTypeEnum.SINGLE.value))
+
+
+def unique_controls(df: DataFrame, control: str, product: str, state: dict | None = None) -> pd.Series:
+    """
+    Embrapa repeats some control codes under different groups (e.g. vm_Tinto under VINHO DE MESA
+    and VINHO FINO DE MESA in Comercio). Repeated codes are qualified with their group name,
+    so (control, product, year) stays unique inside a subcategory
+    :param df: dataframe from external client
+    :param control: control column name
+    :param product: product column name
+    :param state: when the file is processed in batches, keeps the current group and the
+    (control, product) pairs already seen, updated in place
+    :return: control column without repeated codes
+    """
+    state = {} if state is None else state
+    controls = df[control]
+    parents = parent_rows(controls)
+    groups = df[product].astype('string').where(parents).ffill().fillna(state.get('group', '')).str.strip()
+    pairs = list(zip(controls.tolist(), df[product].tolist()))
+    seen = state.setdefault('seen', set())
+    repeated = (df.duplicated([control, product]) | np.array([pair in seen for pair in pairs], dtype=bool)) \
+        & controls.notna()
+    seen.update(pairs)
+    if len(groups):
+        state['group'] = groups.iloc[-1]
+    return controls.where(~repeated, groups + '/' + controls)
+
+
+def process_imp_exp(df: DataFrame, category_uid: str, subcategory: str) -> DataFrame:
+    """
+    Process all csv data when category is IMPORTACAO or EXPORTACAO.
+    Year columns come in pairs: quantity (kg) followed by value (US$)
+    :param df: dataframe from external client
+    :param category_uid: category uid in str format
+    :param subcategory: subcategory name is str
+    :return: long format dataframe
+    """
+    cols = df.columns.values.tolist()
+    new_df = to_long(df, cols[1:2], cols[2::2], qty_product=df[cols[2::2]].to_numpy(),
+                     vl_product=df[cols[3::2]].to_numpy())
+    new_df['category_uid'] = category_uid
+    new_df['subcategory'] = subcategory
+    new_df['row_type'] = RowTypeEnum.SINGLE.value
+    return new_df.rename(columns=new_cols)
+
+
+class StreamParser:
+    """
+    Incremental parser: receives raw chunks (as they arrive from the network) and returns
+    validated dataframes with about batch_size records each, so memory does not depend on
+    the file size nor on the number of year columns
+    """
+
+    def __init__(self, category: str, category_uid: str, subcategory: str, batch_size: int):
+        """
+        :param category: category name in str format
+        :param category_uid: category uid in str format
+        :param subcategory: subcategory name is str
+        :param batch_size: number of long format records by batch
+        """
+        self.source = (category, category_uid, subcategory)
+        self.batch_size = batch_size
+        self._decoder = codecs.getincrementaldecoder('utf-8')(errors='ignore')
+        self._buffer = ''
+        self._layout: tuple[str, str, int] | None = None
+        self._lines: list[str] = []
+        self._state: dict = {}
+
+    def feed(self, chunk: bytes) -> list[DataFrame]:
+        """
+        Decode a new chunk, keeping the incomplete last line for the next one
+        :param chunk: raw CSV content
+        :return: batches completed with this chunk
+        """
+        lines = (self._buffer + self._decoder.decode(chunk)).split('\n')
+        self._buffer = lines.pop()
+        batches = []
+        for line in lines:
+            if self._add_line(line):
+                batches.append(self._convert())
+        return batches
+
+    def close(self) -> DataFrame:
+        """
+        Flush the remaining content, must be called once after the last chunk
+        :return: last batch (empty when the file ended with a complete batch)
+        """
+        self._add_line(self._buffer + self._decoder.decode(b'', final=True))
+        self._buffer = ''
+        return self._convert(final=True)
+
+    def _add_line(self, line: str) -> bool:
+        """
+        Keep a CSV line, the first non empty line is the header
+        :param line: CSV line
+        :return: whether a batch is complete
+        """
+        for stray in STRAY_CHARS:
+            line = line.replace(stray, '')
+        if not line.strip():
+            return False
+        if self._layout is None:
+            header = line.lstrip('\ufeff')
+            separator = detect_separator(header)
+            years = {name.strip()[:4] for name in header.split(separator) if name.strip()[:4].isdigit()}
+            self._layout = (header, separator, max(1, self.batch_size // max(1, len(years))))
+            return False
+        self._lines.append(line)
+        return len(self._lines) >= self._layout[2]
+
+    def _convert(self, final: bool = False) -> DataFrame:
+        """
+        Convert the kept lines in a validated batch. Group rows at the end of a batch are kept for the
+        next one, as only the following row tells whether they have items (see row_types)
+        :param final: whether these are the last lines of the file
+        :return: dataframe with SUBCATEGORY_FIELDS columns, seconds spent in each step in attrs['timings']
+        """
+        if not self._lines:
+            return validate_columns(DataFrame(columns=list(SUBCATEGORY_FIELDS)))
+        begin = time.perf_counter()
+        header, separator, _ = self._layout
+        lines, self._lines = self._lines, []
+        df = pd.read_csv(StringIO('\n'.join([header, *lines])), sep=separator, engine='c')
+        if not final and self.source[0] not in IMP_EXP_CATEGORIES:
+            others = np.flatnonzero(~parent_rows(df[df.columns[1]]).to_numpy(dtype=bool))
+            pending = len(df) - (int(others[-1]) + 1 if len(others) else 0)
+            if pending:
+                self._lines, df = lines[-pending:], df.iloc[:-pending]
+        read = time.perf_counter()
+        df = process_dict(df, *self.source, self._state)
+        melt = time.perf_counter()
+        df = validate_columns(df)
+        df.attrs['timings'] = {'read': read - begin, 'melt': melt - read,
+                               'validate': time.perf_counter() - melt}
+        return df
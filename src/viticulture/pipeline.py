@@ -0,0 +1,223 @@
+"""
+Ingestion Pipeline: responsible for the staged Embrapa ingestion (fetch, parse and write)
+"""
+import asyncio
+import hashlib
+import time
+
+from pandas import DataFrame
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+from src.config import Config
+from src.db.models import Category
+from src.viticulture.downloads import content_hash
+from src.viticulture.enums import ProcessModeEnum
+from src.viticulture.parsers import parse_content, StreamParser
+from src.viticulture.schemas import SubCategoryProgressModel, IngestionStateModel
+from src.viticulture.services import ViticultureService
+from src.viticulture.utils import menus, FILE_PATH, read_file
+
+viticulture_service = ViticultureService()
+
+
+class IngestionPipeline:
+    """
+    Staged ingestion connected by bounded queues: concurrent fetch (API or FILE),
+    parse in a process pool and write in database, so memory stays flat and database
+    writes overlap the remaining downloads.
+    In STREAM mode fetch and parse are a single stage that reads one subcategory at a time
+    chunk by chunk and sends batches with a fixed number of records to the write stage
+    """
+
+    def __init__(self, client, mode: ProcessModeEnum, delta: bool = False,
+                 progress: dict[str, SubCategoryProgressModel] | None = None):
+        """
+        :param client: EmbrapaClient used for downloads and parsing pool
+        :param mode: process mode as Enum
+        :param delta: when True saved subcategories are upserted instead of skipped
+        :param progress: optional dict updated with progress counters by subcategory
+        """
+        self.client = client
+        self.mode = mode
+        self.delta = delta
+        self.progress = {} if progress is None else progress
+        self.timings = {'fetch': 0.0, 'parse': 0.0, 'read': 0.0, 'melt': 0.0, 'validate': 0.0, 'write': 0.0,
+                        'refresh': 0.0}
+        self.counters = {'inserted': 0, 'updated': 0, 'unchanged': 0}
+        self.unchanged_sources: list[str] = []
+
+    async def run(self, categories: list[Category], session: AsyncSession) -> dict:
+        """
+        Process all subcategories of the given categories. Without delta mode subcategories
+        already saved are skipped, with delta mode they are compared and upserted.
+        Aggregate views are refreshed at the end when any row was written
+        :param categories: categories saved in database
+        :param session: current application session
+        :return: counters, skipped and unchanged subcategories and seconds spent in each stage
+        """
+        begin = time.perf_counter()
+        options = [option for single_category in categories for option in menus[single_category.category]]
+        existing = await viticulture_service.existing_subcategories(options, session)
+        skipped = set() if self.delta else set(existing)
+        sources = [(single_category, option) for single_category in categories
+                   for option in menus[single_category.category] if option not in skipped]
+
+        fetched = asyncio.Queue(maxsize=Config.PIPELINE_QUEUE_SIZE)
+        parsed = asyncio.Queue(maxsize=Config.PIPELINE_QUEUE_SIZE)
+        if self.mode == ProcessModeEnum.STREAM:
+            stages = [asyncio.create_task(self._stream_stage(sources, parsed)),
+                      asyncio.create_task(self._write_stage(parsed, 1, session))]
+        else:
+            workers = Config.PARSER_WORKERS
+            stages = [asyncio.create_task(self._fetch_stage(sources, existing, fetched, workers)),
+                      *[asyncio.create_task(self._parse_stage(fetched, parsed)) for _ in range(workers)],
+                      asyncio.create_task(self._write_stage(parsed, workers, session))]
+        try:
+            await asyncio.gather(*stages)
+        finally:
+            for stage in stages:
+                stage.cancel()
+            # cancelled stages may still be using the session, which is closed right after the run
+            await asyncio.gather(*stages, return_exceptions=True)
+        if self.counters['inserted'] or self.counters['updated']:
+            start = time.perf_counter()
+            await viticulture_service.refresh_aggregates(session)
+            self.timings['refresh'] = time.perf_counter() - start
+
+        self.timings['total'] = time.perf_counter() - begin
+        return {'message': 'All data saved successfully in database.',
+                'rows': self.counters['inserted'] + self.counters['updated'], **self.counters,
+                'skipped': sorted(skipped), 'unchanged_sources': sorted(self.unchanged_sources),
+                'timings': {k: round(v, 3) for k, v in self.timings.items()}}
+
+    async def _fetch_stage(self, sources: list[tuple[Category, str]], existing: dict[str, str | None],
+                           output: asyncio.Queue, consumers: int):
+        """
+        First pipeline stage: download (or read) every source with bounded concurrency.
+        Saved subcategories whose download did not change since the last load are dropped
+        :param sources: list of (category, subcategory) to be fetched
+        :param existing: content hash of the last load by subcategory already saved in database
+        :param output: queue consumed by the parse stage
+        :param consumers: number of parse workers waiting for an end marker
+        """
+        semaphore = asyncio.Semaphore(Config.EMBRAPA_CONCURRENCY)
+
+        async def fetch(single_category: Category, option: str):
+            async with semaphore:
+                start = time.perf_counter()
+                entry, changed = None, True
+                if self.mode == ProcessModeEnum.FILE:
+                    content = await asyncio.to_thread(read_file, FILE_PATH.format(option))
+                else:
+                    content, entry, changed = await self.client.download(self.client.get_client(), option)
+                self.timings['fetch'] += time.perf_counter() - start
+                digest = entry.sha256 if entry else content_hash(content)
+                if option in existing and (not changed or existing[option] == digest):
+                    self.unchanged_sources.append(option)
+                    return
+                await output.put((single_category, option, content, entry, digest, start))
+
+        await asyncio.gather(*(fetch(single_category, option) for single_category, option in sources))
+        for _ in range(consumers):
+            await output.put(None)
+
+    async def _parse_stage(self, source: asyncio.Queue, output: asyncio.Queue):
+        """
+        Second pipeline stage: parse raw CSV content in the process pool
+        :param source: queue filled by the fetch stage
+        :param output: queue consumed by the write stage
+        """
+        loop = asyncio.get_running_loop()
+        while (item := await source.get()) is not None:
+            single_category, option, content, entry, digest, begin = item
+            start = time.perf_counter()
+            frame = await loop.run_in_executor(self.client.get_process_pool(), parse_content, content,
+                                                   single_category.category, str(single_category.uid), option)
+            frame.attrs['content_hash'] = digest
+            self.timings['parse'] += time.perf_counter() - start
+            self._parsed(option, frame, begin)
+            await output.put((option, frame, content, entry, begin, True))
+        await output.put(None)
+
+    def _parsed(self, option: str, frame: DataFrame, begin: float):
+        """
+        Account a parsed dataframe: parser step timings (read, melt, validate) and progress
+        :param option: subcategory name in str format
+        :param frame: dataframe returned by the parser
+        :param begin: perf_counter value when the subcategory processing started
+        """
+        for name, value in frame.attrs.get('timings', {}).items():
+            self.timings[name] += value
+        self.track(option, begin, rows_parsed=len(frame))
+
+    async def _stream_stage(self, sources: list[tuple[Category, str]], output: asyncio.Queue):
+        """
+        First pipeline stage in STREAM mode: download every source chunk by chunk (one at a time,
+        so batches of different subcategories never share a transaction) and parse it incrementally.
+        The bounded output queue holds the download while the write stage is busy
+        :param sources: list of (category, subcategory) to be fetched
+        :param output: queue consumed by the write stage
+        """
+        for single_category, option in sources:
+            begin = start = time.perf_counter()
+            parser = StreamParser(single_category.category, str(single_category.uid), option,
+                                  Config.INGESTION_BATCH_SIZE)
+            digest = hashlib.sha256()
+            async for chunk in self.client.stream(self.client.get_client(), option):
+                self.timings['fetch'] += time.perf_counter() - start
+                start = time.perf_counter()
+                digest.update(chunk)
+                frames = await asyncio.to_thread(parser.feed, chunk)
+                self.timings['parse'] += time.perf_counter() - start
+                for frame in frames:
+                    self._parsed(option, frame, begin)
+                    await output.put((option, frame, None, None, begin, False))
+                start = time.perf_counter()
+            frame = parser.close()
+            frame.attrs['content_hash'] = digest.hexdigest()
+            self._parsed(option, frame, begin)
+            await output.put((option, frame, None, None, begin, True))
+        await output.put(None)
+
+    async def _write_stage(self, source: asyncio.Queue, producers: int, session: AsyncSession):
+        """
+        Last pipeline stage: bulk write (or upsert in delta mode) every parsed subcategory.
+        The last batch of a subcategory commits its data together with its tb_ingestion_state row
+        :param source: queue filled by the parse stage
+        :param producers: number of parse workers sending an end marker
+        :param session: current application session
+        """
+        while producers:
+            item = await source.get()
+            if item is None:
+                producers -= 1
+                continue
+            option, frame, content, entry, begin, last = item
+            start = time.perf_counter()
+            if self.delta:
+                counters = await viticulture_service.upsert_subcategories(frame, session, commit=False)
+            else:
+                counters = {'inserted': await viticulture_service.create_subcategories(frame, session,
+                                                                                       commit=False)}
+            if last:
+                await viticulture_service.save_ingestion_state(IngestionStateModel(
+                    subcategory=option, rows=self.progress[option].rows_parsed, source=self.mode,
+                    content_hash=frame.attrs.get('content_hash')), session)
+            self.timings['write'] += time.perf_counter() - start
+            for name, value in counters.items():
+                self.counters[name] += value
+            self.track(option, begin, rows_written=counters.get('inserted', 0) + counters.get('updated', 0))
+            if entry is not None:
+                self.client.cache.store(option, content, entry)
+
+    def track(self, subcategory: str, begin: float, **counters: int):
+        """
+        Increment the progress counters of a subcategory
+        :param subcategory: subcategory name in str format
+        :param begin: perf_counter value when the subcategory processing started
+        :param counters: counters to be incremented (rows_parsed, rows_written)
+        """
+        item = self.progress.setdefault(subcategory, SubCategoryProgressModel())
+        for name, value in counters.items():
+            setattr(item, name, getattr(item, name) + value)
+        item.elapsed = round(time.perf_counter() - begin, 3)
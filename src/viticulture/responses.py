@@ -0,0 +1,25 @@
+"""
+Fast Responses: JSON responses for already validated DTOs, serialized straight to bytes
+by a precompiled pydantic TypeAdapter instead of response_model validation and jsonable_encoder
+"""
+from functools import lru_cache
+
+from fastapi.responses import JSONResponse
+from pydantic import BaseModel, TypeAdapter
+
+
+@lru_cache
+def type_adapter(model: type[BaseModel]) -> TypeAdapter:
+    """
+    TypeAdapter compiled once by model
+    :param model: pydantic model class
+    :return: adapter used to dump the model as JSON bytes
+    """
+    return TypeAdapter(model)
+
+
+class FastJSONResponse(JSONResponse):
+    """Response for a pydantic model instance, enabled by FAST_RESPONSES"""
+
+    def render(self, content: BaseModel) -> bytes:
+        return type_adapter(type(content)).dump_json(content)
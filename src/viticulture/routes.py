@@ -2,17 +2,26 @@
 Viticulture Controller: responsible for getting all Embrapa viticulture data
 """
 
-from typing import List, Optional
+import uuid
+from typing import Annotated
 
-from fastapi import APIRouter, Depends, status
+from fastapi import APIRouter, Depends, status, Query, Header
 from fastapi.exceptions import HTTPException
+from fastapi.responses import JSONResponse, Response, StreamingResponse
 from sqlmodel.ext.asyncio.session import AsyncSession
 
 from src.auth.dependencies import AccessTokenBearer
-from src.db.main import get_session
+from src.config import Config
+from src.db.main import get_session, engine, pool_metrics
+from src.viticulture.cache import query_cache
 from src.viticulture.clients import EmbrapaClient
 from src.viticulture.enums import CategoryEnum, SubCategoryEnum, ProcessModeEnum
-from src.viticulture.schemas import CategoryModel, SubCategoryModel
+from src.viticulture.exports import export_dataset, EXTENSIONS, MEDIA_TYPES
+from src.viticulture.jobs import IngestionJobManager
+from src.viticulture.responses import FastJSONResponse
+from src.viticulture.schemas import CategoryModel, SubCategoryPageModel, JobModel, IngestionQueryModel, \
+    PageQueryModel, CacheStatsModel, CategorySummaryModel, AggregateModel, AggregateQueryModel, \
+    TimeSeriesModel, TimeSeriesQueryModel, ExportQueryModel, PoolStatsModel
 from src.viticulture.services import ViticultureService
 from src.viticulture.utils import menus
 
@@ -20,25 +29,75 @@ viticulture_router = APIRouter()
 access_token_bearer = AccessTokenBearer()
 viticulture_service = ViticultureService()
 feign_client = EmbrapaClient()
+job_manager = IngestionJobManager(feign_client)
+
+
+def job_response(job: JobModel) -> JSONResponse:
+    """Response returned right after an ingestion job submission"""
+    return JSONResponse(status_code=status.HTTP_202_ACCEPTED, content=job.model_dump(mode='json'))
+
+
+@viticulture_router.post('/external_content/all', status_code=status.HTTP_201_CREATED)
+async def get_all_data_from_embrapa(params: Annotated[IngestionQueryModel, Query()],
+                                    session: AsyncSession = Depends(get_session),
+                                    token_details: dict = Depends(access_token_bearer)):
+    """
+    API responsible for download all CSV files from Embrapa website in a single
+    pipeline and save in database, skipping subcategories already saved.
+    With delta=true saved subcategories are refreshed writing only new or changed rows.
+    With async=true the ingestion runs in background and a job is returned
+    """
+    if params.run_async:
+        return job_response(job_manager.submit(None, params.mode, params.delta))
+    return await feign_client.process_all_mode(params.mode, session, delta=params.delta)
 
 
 @viticulture_router.post('/external_content/{category}', status_code=status.HTTP_201_CREATED)
 async def get_data_from_embrapa_by_param(category: CategoryEnum,
-                                         mode: Optional[ProcessModeEnum] = ProcessModeEnum.API,
+                                         params: Annotated[IngestionQueryModel, Query()],
                                          session: AsyncSession = Depends(get_session),
                                          token_details: dict = Depends(access_token_bearer)):
     """
     API responsible for download all CSV files from Embrapa website based
-    on each category param and save in database
+    on each category param and save in database.
+    With delta=true saved data is refreshed writing only new or changed rows.
+    With async=true the ingestion runs in background and a job is returned
     """
-    exists = await viticulture_service.data_exists(menus[category.name], session)
-    if exists:
-        raise HTTPException(status_code=status.HTTP_208_ALREADY_REPORTED,
-                            detail='All data already exists in database.')
+    if not params.delta:
+        exists = await viticulture_service.data_exists(menus[category.name], session)
+        if exists:
+            raise HTTPException(status_code=status.HTTP_208_ALREADY_REPORTED,
+                                detail='All data already exists in database.')
+
+    if params.run_async:
+        return job_response(job_manager.submit(category, params.mode, params.delta))
+    if params.mode == ProcessModeEnum.FILE:
+        return await feign_client.process_file_mode(category, session, delta=params.delta)
+    if params.mode == ProcessModeEnum.STREAM:
+        return await feign_client.process_stream_mode(category, session, delta=params.delta)
+    return await feign_client.process_api_mode(category, session, delta=params.delta)
+
+
+@viticulture_router.get('/jobs/{uid}', response_model=JobModel)
+async def get_job_status(uid: uuid.UUID, token_details: dict = Depends(access_token_bearer)):
+    """API responsible for getting the status and progress of a background ingestion job"""
+    job = job_manager.get_job(uid)
+    if not job:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND,
+                            detail='No job found with this id')
+    return job
 
-    if mode == ProcessModeEnum.FILE:
-        return await feign_client.process_file_mode(category, session)
-    return await feign_client.process_api_mode(category, session)
+
+@viticulture_router.get('/cache/stats', response_model=CacheStatsModel)
+async def get_cache_stats(token_details: dict = Depends(access_token_bearer)):
+    """API responsible for getting the query cache hit, miss and eviction counters"""
+    return query_cache.stats()
+
+
+@viticulture_router.get('/pool/stats', response_model=PoolStatsModel)
+async def get_pool_stats(token_details: dict = Depends(access_token_bearer)):
+    """API responsible for getting the database connection pool saturation and checkout wait times"""
+    return pool_metrics.stats(engine.sync_engine.pool)
 
 
 @viticulture_router.get('/category/{category}', response_model=CategoryModel)
@@ -52,18 +111,95 @@ async def get_by_category(category: CategoryEnum, session: AsyncSession = Depend
     return result
 
 
-@viticulture_router.get('/subcategory/{subcategory}/{year}', response_model=List[SubCategoryModel])
+@viticulture_router.get('/category/{category}/summary', response_model=CategorySummaryModel)
+async def get_category_summary(category: CategoryEnum, session: AsyncSession = Depends(get_session),
+                               token_details: dict = Depends(access_token_bearer)):
+    """API responsible for getting the number of rows and years saved by subcategory of a category"""
+    result = await viticulture_service.get_category_summary(category, session)
+    if not result:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND,
+                            detail='No data found with this category')
+    return result
+
+
+@viticulture_router.get('/subcategory/{subcategory}/{year}', response_model=SubCategoryPageModel)
 async def get_by_subcategory(subcategory: SubCategoryEnum, year: int,
+                             params: Annotated[PageQueryModel, Query()],
                              session: AsyncSession = Depends(get_session),
                              token_details: dict = Depends(access_token_bearer)):
-    """API responsible for getting all data by subcategory and year"""
-    result = await viticulture_service.get_all_subcategories(subcategory, year, session)
-    if len(result) == 0:
+    """
+    API responsible for getting data by subcategory and year, one page at a time.
+    Use the returned next cursor as after param to get the following page.
+    With FAST_RESPONSES the page is serialized directly, without response_model validation
+    """
+    items, cursor = await viticulture_service.get_subcategories_page(subcategory, year, params, session)
+    if len(items) == 0 and params.after is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND,
+                            detail='No data found with this subcategory')
+    page = SubCategoryPageModel(items=items, next=cursor)
+    if Config.FAST_RESPONSES:
+        return FastJSONResponse(page)
+    return page
+
+
+@viticulture_router.get('/aggregate/{subcategory}', response_model=AggregateModel)
+async def get_aggregate(subcategory: SubCategoryEnum, params: Annotated[AggregateQueryModel, Query()],
+                        session: AsyncSession = Depends(get_session),
+                        token_details: dict = Depends(access_token_bearer)):
+    """
+    API responsible for getting totals (metric=sum) or averages (metric=avg) of a subcategory
+    grouped by year, product or country, optionally limited by years (from, to)
+    """
+    result = await viticulture_service.get_aggregate(subcategory, params, session)
+    if len(result.rows) == 0:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND,
                             detail='No data found with this subcategory')
     return result
 
 
+@viticulture_router.get('/timeseries', response_model=TimeSeriesModel)
+async def get_time_series(params: Annotated[TimeSeriesQueryModel, Query()],
+                          session: AsyncSession = Depends(get_session),
+                          token_details: dict = Depends(access_token_bearer)):
+    """
+    API responsible for getting columnar time series of one or more subcategories
+    (e.g. ?subcategory=ImpVinhos&subcategory=ExpVinho&from=2000&to=2020), one series by
+    control, product and country with quantity and value arrays aligned with years
+    """
+    result = await viticulture_service.get_time_series(params, session)
+    if len(result.series) == 0:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND,
+                            detail='No data found with these subcategories')
+    if Config.FAST_RESPONSES:
+        return FastJSONResponse(result)
+    return result
+
+
+@viticulture_router.get('/export')
+async def export_data(params: Annotated[ExportQueryModel, Query()],
+                      if_none_match: Annotated[str | None, Header()] = None,
+                      session: AsyncSession = Depends(get_session),
+                      token_details: dict = Depends(access_token_bearer)):
+    """
+    API responsible for streaming saved data as Parquet, Arrow IPC stream or gzip CSV,
+    optionally filtered by category or subcategory. The dataset version is returned as ETag
+    and saved in the file, a request with If-None-Match of an unchanged version gets 304
+    """
+    subcategories = [option for category, options in menus.items() for option in options
+                     if params.category in (None, category) and params.subcategory in (None, option)]
+    version = await viticulture_service.get_dataset_version(subcategories, session)
+    if not version:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND,
+                            detail='No data found to export')
+    headers = {'ETag': f'"{version}"', 'X-Dataset-Version': version}
+    if if_none_match == headers['ETag']:
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+    filename = f'viticulture-{version}.{EXTENSIONS[params.export_format]}'
+    headers['Content-Disposition'] = f'attachment; filename="{filename}"'
+    return StreamingResponse(export_dataset(params.export_format, subcategories, version),
+                             media_type=MEDIA_TYPES[params.export_format], headers=headers)
+
+
 @viticulture_router.delete('/subcategory/{subcategory}', status_code=status.HTTP_204_NO_CONTENT)
 async def delete_by_subcategory(subcategory: SubCategoryEnum,
                                 session: AsyncSession = Depends(get_session),
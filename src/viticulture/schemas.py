@@ -5,23 +5,15 @@ import uuid
 from datetime import datetime
 from typing import Optional
 
-from pydantic import BaseModel
+from pydantic import BaseModel, ConfigDict, Field
 
-
-class SubCategoryCreateModel(BaseModel):
-    """Embrapa SubCategoryCreateModel with subcategories"""
-    category_uid: uuid.UUID
-    subcategory: str
-    control: Optional[str] = None
-    product: Optional[str] = None
-    country: Optional[str] = None
-    qty_product: Optional[float] = None
-    vl_product: Optional[float] = None
-    year: int
+from src.config import Config
+from src.viticulture.enums import JobStatusEnum, ProcessModeEnum, AggregateGroupEnum, AggregateMetricEnum, \
+    SubCategoryEnum, CategoryEnum, ExportFormatEnum, RowTypeEnum
 
 
 class SubCategoryModel(BaseModel):
-    """Embrapa SubCategoryCreateModel with subcategories"""
+    """Embrapa SubCategoryModel with subcategories"""
     category_uid: uuid.UUID
     subcategory: str
     control: Optional[str] = None
@@ -30,10 +22,23 @@ class SubCategoryModel(BaseModel):
     qty_product: Optional[float] = None
     vl_product: Optional[float] = None
     year: int
+    row_type: RowTypeEnum = RowTypeEnum.SINGLE
     created_at: datetime
     updated_at: datetime
 
 
+class SubCategoryPageModel(BaseModel):
+    """Page of subcategories, next is the cursor of the following page (None in the last one)"""
+    items: list[SubCategoryModel]
+    next: Optional[str] = None
+
+
+class PageQueryModel(BaseModel):
+    """Query params used for keyset pagination"""
+    limit: int = Field(default=Config.PAGE_SIZE, ge=1, le=Config.MAX_PAGE_SIZE)
+    after: Optional[str] = None
+
+
 class CategoryModel(BaseModel):
     """CategoryModel used for view all user data"""
     uid: uuid.UUID
@@ -42,6 +47,151 @@ class CategoryModel(BaseModel):
     updated_at: datetime
 
 
+class SubCategorySummaryModel(BaseModel):
+    """Number of rows and years saved of a single subcategory"""
+    subcategory: str
+    rows: int
+    first_year: int
+    last_year: int
+
+
+class CategorySummaryModel(BaseModel):
+    """CategorySummaryModel used for view the saved subcategories of a category"""
+    uid: uuid.UUID
+    category: str
+    subcategories: list[SubCategorySummaryModel]
+
+
 class CategoryCreateModel(BaseModel):
     """CategoryCreateModel used for registration data"""
     category: str
+
+
+class CacheStatsModel(BaseModel):
+    """Query cache counters, used to size CACHE_MAX_BYTES and CACHE_TTL"""
+    hits: int
+    misses: int
+    evictions: int
+    expirations: int
+    invalidations: int
+    entries: int
+    bytes: int
+    max_bytes: int
+    ttl: float
+    version: int
+
+
+class PoolStatsModel(BaseModel):
+    """Connection pool usage and checkout wait times, used to size DB_POOL_SIZE and DB_MAX_OVERFLOW"""
+    checkouts: int
+    timeouts: int
+    size: int
+    max_overflow: int
+    checked_out: int
+    checked_in: int
+    overflow: int
+    saturation: float
+    peak_saturation: float
+    wait_ms_avg: float
+    wait_ms_p99: float
+    wait_ms_max: float
+
+
+class IngestionStateModel(BaseModel):
+    """IngestionStateModel used for registration of the last load of a subcategory"""
+    subcategory: str
+    rows: int
+    source: Optional[ProcessModeEnum] = None
+    content_hash: Optional[str] = None
+    loaded_at: datetime = Field(default_factory=datetime.now)
+
+
+class SubCategoryProgressModel(BaseModel):
+    """Ingestion progress counters of a single subcategory"""
+    rows_parsed: int = 0
+    rows_written: int = 0
+    elapsed: float = 0.0
+
+
+class JobModel(BaseModel):
+    """JobModel used for view background ingestion status"""
+    uid: uuid.UUID = Field(default_factory=uuid.uuid4)
+    category: str
+    mode: ProcessModeEnum
+    delta: bool = False
+    status: JobStatusEnum = JobStatusEnum.PENDING
+    subcategories: dict[str, SubCategoryProgressModel] = Field(default_factory=dict)
+    result: Optional[dict] = None
+    error: Optional[str] = None
+    created_at: datetime = Field(default_factory=datetime.now)
+    started_at: Optional[datetime] = None
+    finished_at: Optional[datetime] = None
+
+
+class IngestionQueryModel(BaseModel):
+    """Query params used for Embrapa ingestion"""
+    mode: ProcessModeEnum = ProcessModeEnum.API
+    delta: bool = False
+    run_async: bool = Field(default=False, alias='async')
+
+    model_config = ConfigDict(populate_by_name=True)
+
+
+class AggregateQueryModel(BaseModel):
+    """Query params used for aggregation, from and to limit the years (inclusive)"""
+    group_by: AggregateGroupEnum = AggregateGroupEnum.YEAR
+    metric: AggregateMetricEnum = AggregateMetricEnum.SUM
+    from_year: Optional[int] = Field(default=None, alias='from')
+    to_year: Optional[int] = Field(default=None, alias='to')
+
+    model_config = ConfigDict(populate_by_name=True)
+
+
+class AggregateRowModel(BaseModel):
+    """Aggregated quantity and value of a single group, control tells apart products with the same name"""
+    key: int | str
+    control: Optional[str] = None
+    qty_product: Optional[float] = None
+    vl_product: Optional[float] = None
+
+
+class AggregateModel(BaseModel):
+    """AggregateModel used for view totals or averages computed in database"""
+    subcategory: str
+    group_by: AggregateGroupEnum
+    metric: AggregateMetricEnum
+    rows: list[AggregateRowModel]
+
+
+class TimeSeriesQueryModel(BaseModel):
+    """Query params used for time series, from and to limit the years (inclusive)"""
+    subcategory: list[SubCategoryEnum]
+    from_year: Optional[int] = Field(default=None, alias='from')
+    to_year: Optional[int] = Field(default=None, alias='to')
+
+    model_config = ConfigDict(populate_by_name=True)
+
+
+class SeriesModel(BaseModel):
+    """Values of a single series (subcategory, control, product, country) aligned with the years"""
+    subcategory: str
+    control: Optional[str] = None
+    product: Optional[str] = None
+    country: Optional[str] = None
+    qty_product: list[Optional[float]]
+    vl_product: list[Optional[float]]
+
+
+class TimeSeriesModel(BaseModel):
+    """TimeSeriesModel used for columnar time series, series have one value by year (None when missing)"""
+    years: list[int]
+    series: list[SeriesModel]
+
+
+class ExportQueryModel(BaseModel):
+    """Query params used for dataset export, without filters the whole dataset is exported"""
+    export_format: ExportFormatEnum = Field(default=ExportFormatEnum.PARQUET, alias='format')
+    category: Optional[CategoryEnum] = None
+    subcategory: Optional[SubCategoryEnum] = None
+
+    model_config = ConfigDict(populate_by_name=True)
@@ -1,13 +1,37 @@
 """
 Viticulture Service: responsible for database integration
 """
+import base64
+import binascii
+import hashlib
+import uuid
+from collections.abc import AsyncIterator
+from datetime import datetime
 
-from sqlalchemy import delete, cast, String
-from sqlmodel import select, col
+from fastapi import status
+from fastapi.exceptions import HTTPException
+from pandas import DataFrame
+from sqlalchemy import delete, cast, String, insert, text, tuple_, literal_column
+from sqlalchemy.dialects.postgresql import aggregate_order_by, insert as pg_insert
+from sqlmodel import select, col, func
 from sqlmodel.ext.asyncio.session import AsyncSession
 
-from src.db.models import Category, SubCategory
-from src.viticulture.schemas import CategoryCreateModel, SubCategoryCreateModel
+from src.config import Config
+from src.db.models import Category, SubCategory, IngestionState, SUBCATEGORY_NATURAL_KEY, AGGREGATE_VIEWS, \
+    aggregate_view
+from src.viticulture.cache import query_cache
+from src.viticulture.columnar import columnar_store
+from src.viticulture.enums import AggregateGroupEnum, AggregateMetricEnum
+from src.viticulture.schemas import CategoryCreateModel, CategoryModel, PageQueryModel, SubCategoryModel, \
+    CategorySummaryModel, SubCategorySummaryModel, IngestionStateModel, AggregateQueryModel, AggregateModel, \
+    AggregateRowModel, TimeSeriesQueryModel, TimeSeriesModel, SeriesModel
+from src.viticulture.utils import SUBCATEGORY_FIELDS, menus
+
+SUBCATEGORY_COLUMNS = ('uid', *SUBCATEGORY_FIELDS, 'created_at', 'updated_at')
+DATASET_SUBCATEGORIES = [option for options in menus.values() for option in options]
+MAX_BIND_PARAMS = 32767
+# columns compared by upsert_subcategories, rows with the same values are left untouched
+COMPARED_COLUMNS = ('qty_product', 'vl_product', 'row_type')
 
 
 class ViticultureService:
@@ -24,20 +48,115 @@ class ViticultureService:
         new_data = Category(**data.model_dump())
         session.add(new_data)
         await session.commit()
+        query_cache.invalidate()
         return new_data
 
-    async def create_subcategories(self, data: list, session: AsyncSession):
+    async def create_subcategories(self, data: DataFrame, session: AsyncSession,
+                                   batch_size: int = Config.INGESTION_BATCH_SIZE,
+                                   commit: bool = True) -> int:
         """
-        Create multiple subcategories in database with a dictonary
-        and returns the new SubCategory
-        :param data: data in dict type format
+        Create multiple subcategories in database with validated columns in a single transaction.
+        Uses asyncpg COPY when available and multi-row INSERT statements for other drivers
+        :param data: dataframe with SUBCATEGORY_FIELDS columns (see parsers.validate_columns)
         :param session: current application session
+        :param batch_size: number of rows sent to database per batch
+        :param commit: when False the transaction is kept open (more batches of the same subcategory)
+        :return: number of persisted rows
         """
-        for elem in data:
-            new_sub = SubCategoryCreateModel(**elem)
-            subcategory = SubCategory(**new_sub.model_dump())
-            session.add(subcategory)
+        records = self._to_records(data)
+        connection = await session.connection()
+        if connection.dialect.driver == 'asyncpg':
+            await self._copy_records(records, session, batch_size)
+        else:
+            await self._insert_records(records, session, batch_size)
+        if commit:
             await session.commit()
+            query_cache.invalidate()
+        return len(records)
+
+    async def upsert_subcategories(self, data: DataFrame, session: AsyncSession,
+                                   batch_size: int = Config.INGESTION_BATCH_SIZE,
+                                   commit: bool = True) -> dict:
+        """
+        Write multiple subcategories with INSERT ... ON CONFLICT DO UPDATE in a single transaction.
+        Rows are compared by natural key in database, unchanged rows are not updated and only the
+        inserted or updated ones are returned, so no saved row is read by the application
+        :param data: dataframe with SUBCATEGORY_FIELDS columns (see parsers.validate_columns)
+        :param session: current application session
+        :param batch_size: number of rows sent to database per batch
+        :param commit: when False the transaction is kept open (more batches of the same subcategory)
+        :return: dict with inserted, updated and unchanged counters
+        """
+        records = self._to_records(data)
+        counters = {'inserted': 0, 'updated': 0, 'unchanged': len(records)}
+        batch_size = min(batch_size, MAX_BIND_PARAMS // len(SUBCATEGORY_COLUMNS))
+        for begin in range(0, len(records), batch_size):
+            values = [dict(zip(SUBCATEGORY_COLUMNS, record)) for record in records[begin:begin + batch_size]]
+            statement = pg_insert(SubCategory).values(values)
+            statement = statement.on_conflict_do_update(
+                constraint=SUBCATEGORY_NATURAL_KEY,
+                set_={name: statement.excluded[name]
+                      for name in (*COMPARED_COLUMNS, 'category_uid', 'updated_at')},
+                where=tuple_(*[getattr(SubCategory, name) for name in COMPARED_COLUMNS]).is_distinct_from(
+                    tuple_(*[statement.excluded[name] for name in COMPARED_COLUMNS])))
+            # xmax is 0 only in rows inserted by this statement
+            result = await session.execute(statement.returning(literal_column('xmax = 0')))
+            for (inserted,) in result:
+                counters['inserted' if inserted else 'updated'] += 1
+                counters['unchanged'] -= 1
+        if commit:
+            await session.commit()
+            query_cache.invalidate()
+        return counters
+
+    def _to_records(self, data: DataFrame) -> list[tuple]:
+        """
+        Convert validated columns in tuples following SUBCATEGORY_COLUMNS order
+        :param data: dataframe with SUBCATEGORY_FIELDS columns
+        :return: list of tuples
+        """
+        now = datetime.now()
+        columns = []
+        for name in SUBCATEGORY_FIELDS:
+            column = data[name]
+            if name == 'category_uid':
+                uids = {value: uuid.UUID(str(value)) for value in column.unique()}
+                columns.append(column.map(uids).tolist())
+            elif column.dtype.kind == 'f':
+                columns.append(column.astype(object).where(column.notna(), None).tolist())
+            else:
+                columns.append(column.tolist())
+        return [(uuid.uuid4(), *values, now, now) for values in zip(*columns)]
+
+    async def _copy_records(self, records: list[tuple], session: AsyncSession, batch_size: int):
+        """
+        Send all records with asyncpg COPY protocol inside the session transaction
+        :param records: list of tuples following SUBCATEGORY_COLUMNS order
+        :param session: current application session
+        :param batch_size: number of rows sent per COPY command
+        """
+        connection = await session.connection()
+        # asyncpg only opens the session transaction on the first statement sent through SQLAlchemy,
+        # without it every COPY would be committed by itself instead of with session.commit()
+        await connection.exec_driver_sql('SELECT 1')
+        raw_connection = await connection.get_raw_connection()
+        driver_connection = raw_connection.driver_connection
+        for begin in range(0, len(records), batch_size):
+            await driver_connection.copy_records_to_table(
+                SubCategory.__tablename__, records=records[begin:begin + batch_size],
+                columns=SUBCATEGORY_COLUMNS)
+
+    async def _insert_records(self, records: list[tuple], session: AsyncSession, batch_size: int):
+        """
+        Send all records with multi-row INSERT ... VALUES statements (fallback for other drivers)
+        :param records: list of tuples following SUBCATEGORY_COLUMNS order
+        :param session: current application session
+        :param batch_size: number of rows sent per INSERT statement
+        """
+        batch_size = min(batch_size, MAX_BIND_PARAMS // len(SUBCATEGORY_COLUMNS))
+        for begin in range(0, len(records), batch_size):
+            values = [dict(zip(SUBCATEGORY_COLUMNS, record)) for record in records[begin:begin + batch_size]]
+            await session.execute(insert(SubCategory).values(values))
 
     async def data_exists(self, subcategory: list[str], session: AsyncSession) -> bool:
         """
@@ -46,20 +165,237 @@ class ViticultureService:
         :param session: current application session
         :return: bool result
         """
-        statement = select(SubCategory).where(col(SubCategory.subcategory).in_(subcategory))
+        statement = (select(IngestionState.subcategory)
+                     .where(col(IngestionState.subcategory).in_(subcategory)).limit(1))
         result = await session.scalars(statement)
-        return len(result.all()) != 0
+        return result.first() is not None
+
+    async def existing_subcategories(self, subcategory: list[str],
+                                     session: AsyncSession) -> dict[str, str | None]:
+        """
+        Get which subcategories of a list already have data in database, from tb_ingestion_state
+        :param subcategory: value as list[str]
+        :param session: current application session
+        :return: content hash of the last load by subcategory already saved
+        """
+        statement = (select(IngestionState.subcategory, IngestionState.content_hash)
+                     .where(col(IngestionState.subcategory).in_(subcategory)))
+        result = await session.execute(statement)
+        return dict(result.all())
 
-    async def get_category(self, category: str, session: AsyncSession):
+    async def save_ingestion_state(self, state: IngestionStateModel, session: AsyncSession):
         """
-        Get all data by category as str
+        Record the last load of a subcategory and commit it together with the data written
+        in the same session (the write methods are called with commit=False before it)
+        :param state: data in IngestionStateModel type format
+        :param session: current application session
+        """
+        values = state.model_dump()
+        statement = pg_insert(IngestionState).values(values)
+        statement = statement.on_conflict_do_update(index_elements=['subcategory'], set_={
+            name: statement.excluded[name] for name in values if name != 'subcategory'})
+        await session.execute(statement)
+        await session.commit()
+        query_cache.invalidate()
+
+    async def get_category(self, category: str, session: AsyncSession,
+                           cached: bool = True) -> CategoryModel | None:
+        """
+        Get all data by category as str (cached until the next write, see cache.query_cache)
         :param category: Category in str format
         :param session: current application session
+        :param cached: False reads the database, used before creating a category
         :return: Return a list result based in the selected category
         """
-        statement = select(Category).where(Category.category == category)
-        results = await session.scalars(statement)
-        return results.first()
+        async def load():
+            results = await session.scalars(select(Category).where(Category.category == category))
+            single_category = results.first()
+            if single_category is None:
+                return None
+            return CategoryModel.model_validate(single_category, from_attributes=True)
+
+        if not cached:
+            return await load()
+        return await query_cache.get_or_load(('category', category), load)
+
+    async def get_category_summary(self, category: str, session: AsyncSession) -> CategorySummaryModel | None:
+        """
+        Get the number of rows and the years saved of each subcategory of a category,
+        aggregated in database (cached until the next write, see cache.query_cache)
+        :param category: Category in str format
+        :param session: current application session
+        :return: summary or None when the category does not exist
+        """
+        single_category = await self.get_category(category, session)
+        if single_category is None:
+            return None
+
+        async def load():
+            statement = (select(SubCategory.subcategory, func.count(SubCategory.uid),  # pylint: disable=not-callable
+                                func.min(SubCategory.year), func.max(SubCategory.year))
+                         .where(SubCategory.category_uid == single_category.uid)
+                         .group_by(SubCategory.subcategory).order_by(SubCategory.subcategory))
+            result = await session.execute(statement)
+            subcategories = [SubCategorySummaryModel(subcategory=name, rows=rows, first_year=first,
+                                                     last_year=last)
+                             for name, rows, first, last in result.all()]
+            return CategorySummaryModel(uid=single_category.uid, category=single_category.category,
+                                        subcategories=subcategories)
+
+        return await query_cache.get_or_load(('summary', category), load)
+
+    async def get_aggregate(self, subcategory: str, params: AggregateQueryModel,
+                            session: AsyncSession) -> AggregateModel:
+        """
+        Get the totals (or averages) of a subcategory grouped by year, product or country, read from the
+        aggregate materialized views (cached until the next write, see cache.query_cache). A group row
+        (e.g. VINHO DE MESA) and its items are never added together, see models.AGGREGATE_ROWS
+        :param subcategory: SubCategory in str format
+        :param params: group_by, metric and the optional year range (from, to)
+        :param session: current application session
+        :return: one row by group ordered by key
+        """
+        if await self._memory_engine(session):
+            return columnar_store.get_aggregate(subcategory, params)
+        view = aggregate_view(params.group_by.value)
+        keys = [view.c[params.group_by.value]]
+        if params.group_by == AggregateGroupEnum.PRODUCT:
+            # the same product name appears under different groups (e.g. Tinto), each control is kept apart
+            keys.append(view.c.control)
+        qty, vl = func.sum(view.c.qty_sum), func.sum(view.c.vl_sum)
+        if params.metric == AggregateMetricEnum.AVG:
+            qty = qty / func.nullif(func.sum(view.c.qty_count), 0)
+            vl = vl / func.nullif(func.sum(view.c.vl_count), 0)
+        statement = select(*keys, qty, vl).where(view.c.subcategory == subcategory)
+        if params.from_year is not None:
+            statement = statement.where(view.c.year >= params.from_year)
+        if params.to_year is not None:
+            statement = statement.where(view.c.year <= params.to_year)
+
+        async def load():
+            # NULL controls last, as in Postgres, whatever the database (see ColumnarStore.get_aggregate)
+            order = [key.nulls_last() for key in keys]
+            result = await session.execute(statement.group_by(*keys).order_by(*order))
+            rows = [AggregateRowModel(key=row[0], control=row[1] if len(keys) > 1 else None,
+                                      qty_product=row[-2], vl_product=row[-1]) for row in result.all()]
+            return AggregateModel(subcategory=subcategory, group_by=params.group_by, metric=params.metric,
+                                  rows=rows)
+
+        return await query_cache.get_or_load(('aggregate', subcategory, *params.model_dump().values()), load)
+
+    async def get_time_series(self, params: TimeSeriesQueryModel, session: AsyncSession) -> TimeSeriesModel:
+        """
+        Get every series (subcategory, control, product, country) of the given subcategories in columnar
+        format, built by a single query with array_agg (cached until the next write, see cache.query_cache)
+        :param params: subcategories and the optional year range (from, to)
+        :param session: current application session
+        :return: years and the values of each series aligned with them
+        """
+        series_key = (SubCategory.subcategory, SubCategory.control, SubCategory.product, SubCategory.country)
+        statement = (select(*series_key, *[func.array_agg(aggregate_order_by(column, SubCategory.year))
+                                           for column in (SubCategory.year, SubCategory.qty_product,
+                                                          SubCategory.vl_product)])
+                     .where(col(SubCategory.subcategory).in_(params.subcategory)))
+        if params.from_year is not None:
+            statement = statement.where(SubCategory.year >= params.from_year)
+        if params.to_year is not None:
+            statement = statement.where(SubCategory.year <= params.to_year)
+
+        async def load():
+            result = await session.execute(statement.group_by(*series_key).order_by(*series_key))
+            rows = result.all()
+            years = sorted({year for row in rows for year in row[4]})
+            position = {year: index for index, year in enumerate(years)}
+            return TimeSeriesModel(years=years, series=[self._series(row, position) for row in rows])
+
+        key = ('timeseries', tuple(sorted(set(params.subcategory))), params.from_year, params.to_year)
+        return await query_cache.get_or_load(key, load)
+
+    @staticmethod
+    def _series(row: tuple, position: dict[int, int]) -> SeriesModel:
+        """
+        Align the arrays of a series with the years of the response
+        :param row: (subcategory, control, product, country, years, quantities, values)
+        :param position: index of each year in the response
+        :return: series with None in the missing years
+        """
+        subcategory, control, product, country, years, quantities, values = row
+        qty_product, vl_product = [None] * len(position), [None] * len(position)
+        for year, quantity, value in zip(years, quantities, values):
+            qty_product[position[year]], vl_product[position[year]] = quantity, value
+        return SeriesModel(subcategory=subcategory, control=control, product=product, country=country,
+                           qty_product=qty_product, vl_product=vl_product)
+
+    async def stream_subcategories(self, subcategory: list[str], session: AsyncSession,
+                                   batch_size: int) -> AsyncIterator[list[tuple]]:
+        """
+        Read all rows of the given subcategories through a server-side cursor, one batch at a time
+        :param subcategory: value as list[str]
+        :param session: session used only by this stream
+        :param batch_size: number of rows fetched from the cursor at once
+        :return: iterator of batches of rows with SUBCATEGORY_COLUMNS
+        """
+        statement = (select(*[getattr(SubCategory, name) for name in SUBCATEGORY_COLUMNS])
+                     .where(col(SubCategory.subcategory).in_(subcategory))
+                     .order_by(SubCategory.subcategory, SubCategory.year, SubCategory.uid)
+                     .execution_options(yield_per=batch_size))
+        result = await session.stream(statement)
+        async for rows in result.partitions(batch_size):
+            yield rows
+
+    async def get_dataset_version(self, subcategory: list[str], session: AsyncSession) -> str | None:
+        """
+        Version of the data of the given subcategories, based in their last loads (tb_ingestion_state),
+        so it only changes when any of them is loaded again or deleted
+        :param subcategory: value as list[str]
+        :param session: current application session
+        :return: short hash or None when no subcategory was loaded
+        """
+        statement = (select(IngestionState.subcategory, IngestionState.rows, IngestionState.content_hash,
+                            IngestionState.loaded_at)
+                     .where(col(IngestionState.subcategory).in_(subcategory))
+                     .order_by(IngestionState.subcategory))
+        result = await session.execute(statement)
+        states = result.all()
+        if not states:
+            return None
+        return hashlib.sha256(repr([tuple(state) for state in states]).encode()).hexdigest()[:16]
+
+    async def refresh_aggregates(self, session: AsyncSession):
+        """
+        Refresh the aggregate materialized views (without blocking their readers) and commit
+        :param session: current application session
+        """
+        for group_by in AGGREGATE_VIEWS:
+            await session.execute(text(f'REFRESH MATERIALIZED VIEW CONCURRENTLY mv_aggregate_{group_by}'))
+        await session.commit()
+        query_cache.invalidate()
+        if Config.READ_ENGINE == 'memory':
+            await self.load_columnar(session)
+
+    async def load_columnar(self, session: AsyncSession):
+        """
+        Load columnar_store with the current rows, tagged with the dataset version read before them
+        :param session: current application session
+        """
+        version = await self.get_dataset_version(DATASET_SUBCATEGORIES, session)
+        await columnar_store.reload(session, version)
+
+    async def _memory_engine(self, session: AsyncSession) -> bool:
+        """
+        Whether reads are answered by the in-memory columnar store (READ_ENGINE=memory, already loaded).
+        Every COLUMNAR_CHECK_INTERVAL seconds the dataset version is read again and the store is reloaded
+        when another process wrote since its load
+        :param session: current application session
+        :return: True to read from columnar_store
+        """
+        if Config.READ_ENGINE != 'memory' or columnar_store.snapshot is None:
+            return False
+        if columnar_store.check_due(Config.COLUMNAR_CHECK_INTERVAL) and \
+                await self.get_dataset_version(DATASET_SUBCATEGORIES, session) != columnar_store.version:
+            query_cache.invalidate()
+            await self.load_columnar(session)
+        return True
 
     async def get_all_subcategories(self, subcategory: str, year: int, session: AsyncSession):
         """
@@ -69,11 +405,90 @@ class ViticultureService:
         :param session: current application session
         :return: Return a list result based in the selected subcategory
         """
+        if await self._memory_engine(session):
+            return columnar_store.get_all_subcategories(subcategory, year)
         statement = (select(SubCategory).where(SubCategory.subcategory == subcategory)
                      .where(SubCategory.year == year))
         result = await session.scalars(statement)
         return result.all()
 
+    async def get_subcategories_page(self, subcategory: str, year: int, page: PageQueryModel,
+                                     session: AsyncSession) -> tuple[list[SubCategoryModel], str | None]:
+        """
+        Get a page of data by subcategory and year ordered by uid (keyset pagination),
+        so every page costs the same index range scan, unlike OFFSET.
+        Pages are cached until the next write (see cache.query_cache)
+        :param subcategory: SubCategory in str format
+        :param year: integer value
+        :param page: page size (limit) and cursor returned by the previous page (after, None in the first one)
+        :param session: current application session
+        :return: page rows and the cursor of the next page (None in the last one)
+        """
+        if await self._memory_engine(session):
+            after = self.decode_cursor(page.after) if page.after is not None else None
+            items, last = columnar_store.get_subcategories_page(subcategory, year, page.limit, after)
+            return items, self.encode_cursor(last) if last is not None else None
+        statement = self._page_statement(subcategory, year, page.limit,
+                                         self.decode_cursor(page.after) if page.after is not None else None)
+
+        async def load():
+            result = await session.scalars(statement)
+            rows = result.all()
+            items = [SubCategoryModel.model_validate(row, from_attributes=True) for row in rows[:page.limit]]
+            if len(rows) > page.limit:
+                return items, self.encode_cursor(rows[page.limit - 1].uid)
+            return items, None
+
+        return await query_cache.get_or_load(('subcategory', subcategory, year, page.limit, page.after), load)
+
+    @staticmethod
+    def _page_statement(subcategory: str, year: int, limit: int, after: uuid.UUID | None):
+        """
+        Keyset pagination query, reading one row more than the page to know if there is a next one
+        :param subcategory: SubCategory in str format
+        :param year: integer value
+        :param limit: page size
+        :param after: uid of the last row of the previous page or None for the first one
+        :return: select statement
+        """
+        statement = (select(SubCategory).where(SubCategory.subcategory == subcategory)
+                     .where(SubCategory.year == year))
+        if after is not None:
+            statement = statement.where(SubCategory.uid > after)
+        return statement.order_by(SubCategory.uid).limit(limit + 1)
+
+    async def warm_up(self, session: AsyncSession):
+        """
+        Run the hot read statements once, bypassing query_cache, so the connection of the session
+        has them prepared (see db.main.prewarm_pool)
+        :param session: session of the connection being warmed
+        """
+        await session.scalars(select(Category).where(Category.category == ''))
+        for after in (None, uuid.UUID(int=0)):
+            await session.scalars(self._page_statement('', 0, Config.PAGE_SIZE, after))
+
+    @staticmethod
+    def encode_cursor(uid: uuid.UUID) -> str:
+        """
+        Opaque pagination cursor
+        :param uid: uid of the last row of the page
+        :return: urlsafe base64 cursor
+        """
+        return base64.urlsafe_b64encode(uid.bytes).decode().rstrip('=')
+
+    @staticmethod
+    def decode_cursor(cursor: str) -> uuid.UUID:
+        """
+        Read a pagination cursor created by encode_cursor
+        :param cursor: urlsafe base64 cursor
+        :return: uid of the last row of the previous page
+        """
+        try:
+            return uuid.UUID(bytes=base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)))
+        except (binascii.Error, ValueError) as e:
+            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST,
+                                detail='Invalid pagination cursor') from e
+
     async def delete_subcategory(self, subcategory: str, session: AsyncSession) -> dict | None:
         """
         Remove all data by subcategory as str format
@@ -85,6 +500,7 @@ class ViticultureService:
 
         if statement is not None:
             await session.scalars(statement)
-            await session.commit()
+            await session.execute(delete(IngestionState).where(IngestionState.subcategory == subcategory))
+            await self.refresh_aggregates(session)
             return {}
         return None
@@ -2,8 +2,8 @@
 Utilities for Embrapa external communication
 """
 
-URL = 'http://vitibrasil.cnpuv.embrapa.br/download/{}.csv'
 FILE_PATH = 'files/{}.csv'
+CACHE_PATH = 'cache'
 
 menus = {
     'PRODUCAO': ['Producao'],
@@ -13,4 +13,17 @@ menus = {
     'EXPORTACAO': ['ExpVinho', 'ExpEspumantes', 'ExpUva', 'ExpSuco']
 }
 
-new_cols = {'cultivar': 'product', 'País': 'country', 'produto': 'product'}
+SUBCATEGORY_FIELDS = ('subcategory', 'control', 'product', 'country', 'qty_product', 'vl_product',
+                      'year', 'category_uid', 'row_type')
+
+new_cols = {'cultivar': 'product', 'País': 'country', 'produto': 'product', 'Produto': 'product'}
+
+
+def read_file(path: str) -> bytes:
+    """
+    Read an internal CSV file as raw content
+    :param path: file path in str format
+    :return: raw file content
+    """
+    with open(path, 'rb') as file:
+        return file.read()
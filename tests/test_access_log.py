@@ -0,0 +1,24 @@
+"""
+Access log: database time of each request measured by the engine events
+"""
+from types import SimpleNamespace
+
+from src.access_log import request_timings, start_query_timer, stop_query_timer, stop_failed_query_timer
+
+
+def test_failed_statement_does_not_leak_its_start():
+    """A failed statement is counted once and the next statements are timed from their own start"""
+    timings = {'db': 0, 'queries': 0}
+    token = request_timings.set(timings)
+    try:
+        failed, succeeded = SimpleNamespace(), SimpleNamespace()
+        start_query_timer(None, None, 'SELECT 1', {}, failed, False)
+        stop_failed_query_timer(SimpleNamespace(execution_context=failed))
+        start_query_timer(None, None, 'SELECT 2', {}, succeeded, False)
+        stop_query_timer(None, None, 'SELECT 2', {}, succeeded, False)
+        stop_failed_query_timer(SimpleNamespace(execution_context=None))
+    finally:
+        request_timings.reset(token)
+
+    assert timings['queries'] == 2
+    assert failed.query_start is None and succeeded.query_start is None
@@ -0,0 +1,108 @@
+"""
+Aggregates: row types written by the parsers, the totals of the aggregate views and of the columnar store
+"""
+import asyncio
+import uuid
+from types import SimpleNamespace
+
+import pandas as pd
+import pytest
+import sqlalchemy as sa
+
+from src.db.models import SubCategory, AGGREGATE_VIEWS, aggregate_view_ddl
+from src.viticulture import services
+from src.viticulture.columnar import ColumnarSnapshot, ColumnarStore
+from src.viticulture.enums import RowTypeEnum, AggregateGroupEnum, AggregateMetricEnum
+from src.viticulture.parsers import parse_content, parent_rows, validate_columns, StreamParser
+from src.viticulture.schemas import AggregateQueryModel
+from src.viticulture.utils import read_file
+
+CATEGORY_UID = str(uuid.uuid4())
+
+
+@pytest.fixture(name='comercio', scope='module')
+def comercio_fixture():
+    """Comercio file parsed at once"""
+    return parse_content(read_file('files/Comercio.csv'), 'COMERCIALIZACAO', CATEGORY_UID, 'Comercio')
+
+
+@pytest.fixture(name='records', scope='module')
+def records_fixture(comercio):
+    """Comercio, ImpVinhos (grouped by country) and Producao rows with products without control"""
+    imp_vinhos = parse_content(read_file('files/ImpVinhos.csv'), 'IMPORTACAO', CATEGORY_UID, 'ImpVinhos')
+    producao = validate_columns(pd.DataFrame({
+        'subcategory': 'Producao', 'control': ['VINHO DE MESA', 'vm_Tinto', None, None],
+        'product': ['VINHO DE MESA', 'Tinto', 'Tinto', 'Sem controle'], 'qty_product': [5.0, 5.0, 2.0, 1.0],
+        'year': 2020, 'category_uid': CATEGORY_UID, 'row_type': ['group', 'item', 'single', 'single']}))
+    data = pd.concat([comercio, imp_vinhos, producao], ignore_index=True)
+    return services.ViticultureService()._to_records(data)  # pylint: disable=protected-access
+
+
+@pytest.fixture(name='session')
+def session_fixture(records, monkeypatch):
+    """SQLite database with the records and the aggregate views (plain views instead of materialized)"""
+    monkeypatch.setattr(services.query_cache, 'ttl', 0)
+    engine = sa.create_engine('sqlite://')
+    with engine.begin() as connection:
+        SubCategory.__table__.create(connection)
+        for group_by in AGGREGATE_VIEWS:
+            connection.exec_driver_sql(aggregate_view_ddl(group_by)[0].replace(
+                'CREATE MATERIALIZED VIEW IF NOT EXISTS', 'CREATE VIEW IF NOT EXISTS'))
+        connection.execute(SubCategory.__table__.insert(),
+                           [dict(zip(services.SUBCATEGORY_COLUMNS, record)) for record in records])
+    with engine.connect() as connection:
+
+        async def execute(statement):
+            return connection.execute(statement)
+
+        # AsyncSession replacement running the statements in the SQLite connection
+        yield SimpleNamespace(execute=execute)
+    engine.dispose()
+
+
+def test_stream_row_types(comercio):
+    """Batches end anywhere, the row types are the same of the whole file"""
+    content = read_file('files/Comercio.csv')
+    parser = StreamParser('COMERCIALIZACAO', CATEGORY_UID, 'Comercio', 7)
+    batches = [batch for start in range(0, len(content), 1000)
+               for batch in parser.feed(content[start:start + 1000])]
+    batches.append(parser.close())
+    columns = ['year', 'control', 'product', 'row_type']
+    streamed = pd.concat(batches)[columns].astype(str).sort_values(columns, ignore_index=True)
+
+    assert streamed.equals(comercio[columns].astype(str).sort_values(columns, ignore_index=True))
+    by_product = dict(zip(comercio['product'].str.strip(), comercio['row_type']))
+    assert by_product['VINHO FRIZANTE'] == RowTypeEnum.SINGLE
+    assert by_product['OUTROS PRODUTOS COMERCIALIZADOS'] == RowTypeEnum.GROUP
+    assert by_product['Tinto'] == RowTypeEnum.ITEM
+
+
+def test_year_total_adds_group_rows(comercio, session):
+    """The Comercio total of each year is the sum of its group rows, with or without items"""
+    aggregate = asyncio.run(services.ViticultureService().get_aggregate(
+        'Comercio', AggregateQueryModel(group_by='year'), session))
+
+    groups = comercio[parent_rows(comercio['control'])].groupby('year')['qty_product'].sum()
+    assert {row.key: row.qty_product for row in aggregate.rows} == pytest.approx(groups.to_dict())
+    assert groups[1970] == 135765587
+
+
+@pytest.mark.parametrize('subcategory, group_by', [
+    ('Comercio', AggregateGroupEnum.YEAR), ('Comercio', AggregateGroupEnum.PRODUCT),
+    ('ImpVinhos', AggregateGroupEnum.YEAR), ('ImpVinhos', AggregateGroupEnum.COUNTRY),
+    ('Producao', AggregateGroupEnum.YEAR), ('Producao', AggregateGroupEnum.PRODUCT)])
+@pytest.mark.parametrize('metric', list(AggregateMetricEnum))
+def test_engines_agree(records, session, subcategory, group_by, metric):
+    """The columnar store and the aggregate views return the same rows"""
+    store = ColumnarStore()
+    store.snapshot = ColumnarSnapshot(pd.DataFrame(records, columns=list(services.SUBCATEGORY_COLUMNS)))
+    params = AggregateQueryModel(group_by=group_by, metric=metric, to_year=2020)
+
+    database = asyncio.run(services.ViticultureService().get_aggregate(subcategory, params, session))
+    memory = store.get_aggregate(subcategory, params)
+
+    assert database.rows
+    assert [(row.key, row.control) for row in memory.rows] == \
+        [(row.key, row.control) for row in database.rows]
+    for expected, row in zip(database.rows, memory.rows):
+        assert (row.qty_product, row.vl_product) == pytest.approx((expected.qty_product, expected.vl_product))
@@ -0,0 +1,30 @@
+"""
+Query cache: what is cached and how much of the memory budget it takes
+"""
+import asyncio
+
+from src.viticulture.cache import QueryCache, estimate_size
+from src.viticulture.schemas import PageQueryModel
+
+
+def test_missing_result_is_not_cached():
+    """A None result is loaded again, so a row created meanwhile is found"""
+    cache, results = QueryCache(1024, 60), [None, 'found']
+
+    async def load():
+        return results.pop(0)
+
+    assert asyncio.run(cache.get_or_load('key', load)) is None
+    assert asyncio.run(cache.get_or_load('key', load)) == 'found'
+    assert asyncio.run(cache.get_or_load('key', load)) == 'found'
+    assert cache.stats()['misses'] == 2
+
+
+def test_page_size_counts_items_and_cursor():
+    """A (items, cursor) page is measured item by item, lists by their first row"""
+    row = PageQueryModel(after='cursor')
+    items = [row] * 10
+
+    assert estimate_size((items, None)) == estimate_size(items) + estimate_size(None) + 4
+    assert estimate_size((items, 'x' * 100)) - estimate_size((items, None)) == 96
+    assert estimate_size(items) == (estimate_size(row) + 1) * 10 + 2
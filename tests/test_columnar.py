@@ -0,0 +1,68 @@
+"""
+Columnar store: aggregates of item rows and reloads when the dataset version changes
+"""
+import asyncio
+import uuid
+from datetime import datetime
+
+import pandas as pd
+
+from src.config import Config
+from src.viticulture import services
+from src.viticulture.columnar import ColumnarSnapshot, COLUMNS
+from src.viticulture.schemas import AggregateQueryModel
+
+ROWS = [('VINHO DE MESA', 'VINHO DE MESA', 30.0, 'group'), ('vm_Tinto', 'Tinto', 20.0, 'item'),
+        ('vm_Branco', 'Branco', 10.0, 'item'), ('VINHO FINO DE MESA', 'VINHO FINO DE MESA', 5.0, 'group'),
+        ('VINHO FINO DE MESA/vm_Tinto', 'Tinto', 5.0, 'item')]
+
+
+def snapshot() -> ColumnarSnapshot:
+    """
+    Producao rows of one year, group rows followed by their items
+    :return: snapshot of the rows
+    """
+    now = datetime(2024, 1, 1)
+    category = uuid.uuid4()
+    data = pd.DataFrame([(uuid.uuid4(), 'Producao', control, product, None, quantity, None, 2020, category,
+                          row_type, now, now) for control, product, quantity, row_type in ROWS],
+                        columns=list(COLUMNS))
+    return ColumnarSnapshot(data)
+
+
+def test_aggregate_skips_group_rows(monkeypatch):
+    """Group rows are not added again and products with the same name are kept apart by control"""
+    monkeypatch.setattr(services.columnar_store, 'snapshot', snapshot())
+
+    by_year = services.columnar_store.get_aggregate('Producao', AggregateQueryModel(group_by='year'))
+    by_product = services.columnar_store.get_aggregate('Producao', AggregateQueryModel(group_by='product'))
+
+    assert [(row.key, row.qty_product) for row in by_year.rows] == [(2020, 35.0)]
+    assert [(row.key, row.control, row.qty_product) for row in by_product.rows] == [
+        ('Branco', 'vm_Branco', 10.0), ('Tinto', 'VINHO FINO DE MESA/vm_Tinto', 5.0),
+        ('Tinto', 'vm_Tinto', 20.0)]
+
+
+def test_memory_reads_reload_new_version(monkeypatch):
+    """A version written by another process reloads the store before a read, the same version does not"""
+    store, service = services.columnar_store, services.ViticultureService()
+    versions, reloads = ['v1'], []
+
+    async def get_dataset_version(subcategory, session):
+        return versions[-1]
+
+    async def reload(session, version):
+        reloads.append(version)
+        store.version = version
+
+    monkeypatch.setattr(Config, 'READ_ENGINE', 'memory')
+    monkeypatch.setattr(Config, 'COLUMNAR_CHECK_INTERVAL', 0)
+    monkeypatch.setattr(store, 'snapshot', snapshot())
+    monkeypatch.setattr(store, 'version', 'v1')
+    monkeypatch.setattr(store, 'reload', reload)
+    monkeypatch.setattr(service, 'get_dataset_version', get_dataset_version)
+
+    assert len(asyncio.run(service.get_all_subcategories('Producao', 2020, None))) == len(ROWS)
+    versions.append('v2')
+    asyncio.run(service.get_all_subcategories('Producao', 2020, None))
+    assert reloads == ['v2']
@@ -0,0 +1,42 @@
+"""
+Ingestion pipeline: stages are finished before the run returns, even when one of them fails
+"""
+import asyncio
+
+import pytest
+
+from src.viticulture import pipeline
+from src.viticulture.enums import ProcessModeEnum
+
+
+def test_failed_stage_waits_for_the_others(monkeypatch):
+    """The remaining stages are cancelled and awaited before the error reaches the caller"""
+    finished = []
+
+    async def existing_subcategories(subcategory, session):
+        return {}
+
+    async def fetch_stage(self, sources, existing, output, consumers):
+        await asyncio.sleep(0)
+        raise RuntimeError('download failed')
+
+    async def parse_stage(self, *_):
+        try:
+            await asyncio.sleep(60)
+        except asyncio.CancelledError:
+            await asyncio.sleep(0)
+            finished.append('parse')
+            raise
+
+    async def run():
+        with pytest.raises(RuntimeError):
+            await pipeline.IngestionPipeline(None, ProcessModeEnum.FILE).run([], None)
+        return list(finished)
+
+    monkeypatch.setattr(pipeline.viticulture_service, 'existing_subcategories', existing_subcategories)
+    monkeypatch.setattr(pipeline.IngestionPipeline, '_fetch_stage', fetch_stage)
+    monkeypatch.setattr(pipeline.IngestionPipeline, '_parse_stage', parse_stage)
+    monkeypatch.setattr(pipeline.IngestionPipeline, '_write_stage', parse_stage)
+    monkeypatch.setattr(pipeline.Config, 'PARSER_WORKERS', 2)
+
+    assert asyncio.run(run()) == ['parse'] * 3
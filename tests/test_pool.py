@@ -0,0 +1,35 @@
+"""
+Connection pool warm up: a failed connection does not block the others nor the startup
+"""
+import asyncio
+import contextlib
+import itertools
+
+from src.config import Config
+from src.db import main
+
+
+def test_prewarm_failure_releases_the_others(monkeypatch, caplog):
+    """The sessions waiting for the failed one are released and the error is only logged"""
+    opened, closed = itertools.count(), []
+
+    @contextlib.asynccontextmanager
+    async def session_factory():
+        session = next(opened)
+        try:
+            yield session
+        finally:
+            closed.append(session)
+
+    async def warm_up(session):
+        await asyncio.sleep(0)
+        if session == 0:
+            raise OSError('connection refused')
+
+    monkeypatch.setattr(Config, 'DB_POOL_MIN_SIZE', 3)
+    monkeypatch.setattr(Config, 'DB_POOL_SIZE', 3)
+    monkeypatch.setattr(main, 'session_factory', session_factory)
+    asyncio.run(asyncio.wait_for(main.prewarm_pool(warm_up), 5))
+
+    assert sorted(closed) == [0, 1, 2]
+    assert 'connection refused' in caplog.text
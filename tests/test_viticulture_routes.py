@@ -0,0 +1,107 @@
+"""
+Viticulture routes: query params read through their aliases (async, from, to, format)
+"""
+import gzip
+import io
+import uuid
+from datetime import datetime
+
+import pyarrow as pa
+import pyarrow.parquet as pq
+import pytest
+
+from src.viticulture import exports, routes
+from src.viticulture.enums import AggregateGroupEnum, AggregateMetricEnum, ProcessModeEnum
+from src.viticulture.schemas import AggregateModel, AggregateRowModel, JobModel, SeriesModel, TimeSeriesModel
+
+
+def test_async_ingestion_returns_job(client, monkeypatch):
+    """?async=true submits a background job and answers 202 with its id"""
+    submitted = []
+
+    def submit(category, mode, delta=False):
+        submitted.append((category, mode, delta))
+        return JobModel(category='ALL', mode=mode, delta=delta)
+
+    monkeypatch.setattr(routes.job_manager, 'submit', submit)
+    response = client.post('/v1/api/viticulture/external_content/all?async=true&mode=FILE')
+
+    assert response.status_code == 202
+    assert response.json()['uid']
+    assert submitted == [(None, ProcessModeEnum.FILE, False)]
+
+
+def test_aggregate_reads_year_range(client, monkeypatch):
+    """?from=&to= reach the service as from_year and to_year"""
+    received = []
+
+    async def get_aggregate(subcategory, params, session):
+        received.append((subcategory, params))
+        return AggregateModel(subcategory=subcategory, group_by=params.group_by, metric=params.metric,
+                              rows=[AggregateRowModel(key='Tinto', control='vm_Tinto', qty_product=1.0)])
+
+    monkeypatch.setattr(routes.viticulture_service, 'get_aggregate', get_aggregate)
+    response = client.get('/v1/api/viticulture/aggregate/Producao',
+                          params={'group_by': 'product', 'metric': 'avg', 'from': 2000, 'to': 2010})
+
+    assert response.status_code == 200
+    assert response.json()['rows'][0]['control'] == 'vm_Tinto'
+    assert len(received) == 1
+    subcategory, params = received[0]
+    assert subcategory == 'Producao'
+    assert (params.group_by, params.metric) == (AggregateGroupEnum.PRODUCT, AggregateMetricEnum.AVG)
+    assert (params.from_year, params.to_year) == (2000, 2010)
+
+
+def test_time_series_reads_year_range(client, monkeypatch):
+    """Repeated subcategory and ?from=&to= reach the service as from_year and to_year"""
+    received = []
+
+    async def get_time_series(params, session):
+        received.append(params)
+        return TimeSeriesModel(years=[2000], series=[SeriesModel(subcategory='ImpVinhos', country='Chile',
+                                                                 qty_product=[1.0], vl_product=[2.0])])
+
+    monkeypatch.setattr(routes.viticulture_service, 'get_time_series', get_time_series)
+    response = client.get('/v1/api/viticulture/timeseries',
+                          params={'subcategory': ['ImpVinhos', 'ExpVinho'], 'from': 2000, 'to': 2010})
+
+    assert response.status_code == 200
+    assert len(received) == 1
+    assert received[0].subcategory == ['ImpVinhos', 'ExpVinho']
+    assert (received[0].from_year, received[0].to_year) == (2000, 2010)
+
+
+@pytest.mark.parametrize('export_format, media_type', [
+    ('parquet', 'application/vnd.apache.parquet'),
+    ('arrow', 'application/vnd.apache.arrow.stream'),
+    ('csv', 'application/gzip')])
+def test_export_format(client, monkeypatch, export_format, media_type):
+    """?format= selects the encoding, its content type and file extension"""
+    row = (uuid.uuid4(), 'ImpVinhos', None, None, 'Chile', 1.0, 2.0, 2000, uuid.uuid4(), 'single',
+           datetime(2024, 1, 1), datetime(2024, 1, 1))
+
+    async def get_dataset_version(subcategory, session):
+        return 'abc123'
+
+    async def stream_subcategories(subcategory, session, batch_size):
+        yield [row]
+
+    monkeypatch.setattr(routes.viticulture_service, 'get_dataset_version', get_dataset_version)
+    monkeypatch.setattr(exports.viticulture_service, 'stream_subcategories', stream_subcategories)
+    response = client.get('/v1/api/viticulture/export', params={'format': export_format,
+                                                                'subcategory': 'ImpVinhos'})
+
+    assert response.status_code == 200
+    assert response.headers['content-type'] == media_type
+    assert response.headers['etag'] == '"abc123"'
+    assert f'.{exports.EXTENSIONS[export_format]}"' in response.headers['content-disposition']
+    if export_format == 'parquet':
+        table = pq.read_table(io.BytesIO(response.content))
+    elif export_format == 'arrow':
+        table = pa.ipc.open_stream(response.content).read_all()
+    else:
+        table = None
+        assert gzip.decompress(response.content).decode().startswith('# dataset_version=abc123\nuid,')
+    if table is not None:
+        assert table.column('country').to_pylist() == ['Chile']